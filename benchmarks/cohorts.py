@@ -0,0 +1,44 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Synthetic cohorts for the benchmarks.
+"""
+from __future__ import division
+from __future__ import print_function
+import numpy as np
+
+
+def synthetic_cohort(donors, tie_rate=0.1, censored=0.3, groups=1, seed=0):
+    """
+    Random cohort with exponential survival times. Group g's hazard is 1 + 0.1 * g times the first group's, so the
+    groups' curves differ.
+    :param donors: number of donors
+    :param tie_rate: fraction of donors sharing their time with an earlier donor; times are drawn from a pool of
+        donors * (1 - tie_rate) distinct values
+    :param censored: fraction of censored donors
+    :param groups: number of groups
+    :param seed: seed of the random generator
+    :return: (times, events, labels) arrays, events True where the donor died, labels the group of each donor
+    """
+    donors = int(donors)
+    random = np.random.default_rng(seed)
+    labels = random.integers(groups, size=donors)
+    distinct = max(1, int(round(donors * (1 - tie_rate))))
+    pool = np.sort(random.exponential(365.0, size=distinct))
+    # The same quantile of the pool in every group, scaled down by the group's hazard
+    times = pool[random.integers(distinct, size=donors)] / (1 + 0.1 * labels)
+    events = random.random(donors) >= censored
+    return times, events, labels
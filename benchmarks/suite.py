@@ -0,0 +1,199 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Benchmark stages, json baselines and regression comparison.
+"""
+from __future__ import division
+from __future__ import print_function
+import argparse
+import gc
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+from benchmarks.cohorts import synthetic_cohort
+from survivalpy.logrank import LogRankTest
+from survivalpy.survival import Analyzer, Datum
+
+SIZES = (1e3, 1e4, 1e5)
+KEY = ('stage', 'donors', 'tieRate', 'censored', 'groups')
+
+
+def measure(function, repeat=3):
+    """
+    Best wall time of a function over repeat calls, and its peak traced memory in a separate call, since tracing
+    slows allocations down.
+    :param function: function without arguments
+    :param repeat: number of timed calls
+    :return: (seconds, peak bytes, result of the last call)
+    """
+    results = []
+    seconds = min(timeit.repeat(lambda: results.append(function()), number=1, repeat=repeat))
+    del results[:]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        results.append(function())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, results[-1]
+
+
+def run_cohort(donors, tie_rate=0.1, censored=0.3, groups=2, repeat=3, max_object_donors=1e5, seed=0):
+    """
+    Benchmarks every stage on one synthetic cohort. Stages building Datum or Interval objects per donor are skipped
+    above max_object_donors.
+    :param donors: number of donors
+    :param tie_rate: as for synthetic_cohort
+    :param censored: as for synthetic_cohort
+    :param groups: as for synthetic_cohort, log-rank stages need at least two
+    :param repeat: number of timed calls of each stage
+    :param max_object_donors: largest cohort for the object stages
+    :param seed: seed of the random generator
+    :return: list of result dictionaries
+    """
+    times, events, labels = synthetic_cohort(donors, tie_rate, censored, groups, seed)
+    config = {'donors': int(donors), 'tieRate': tie_rate, 'censored': censored, 'groups': groups}
+    results = []
+
+    def stage(name, function):
+        seconds, peak, result = measure(function, repeat)
+        record = dict(config, stage=name, seconds=seconds, peakBytes=peak)
+        results.append(record)
+        return result
+
+    stage('Analyzer.compute_table', lambda: Analyzer.from_arrays(times, events).compute_table())
+    tables = stage('Analyzer.compute_many', lambda: Analyzer.compute_many(times, events, groups=labels))
+
+    if donors <= max_object_donors:
+        stage('Analyzer.compute[columns]', lambda: Analyzer.from_arrays(times, events).compute())
+        data = [Datum(t, not e) for t, e in zip(times.tolist(), events.tolist())]
+        intervals = stage('Analyzer.compute[Datum]', lambda: Analyzer(data).compute())
+        stage('Interval.to_json_dict', lambda: [interval.to_json_dict() for interval in intervals])
+
+    if groups > 1:
+        test = stage('LogRankTest.__init__', lambda: LogRankTest(tables))
+        for method in LogRankTest.METHODS:
+            test.method = method
+            stage('LogRankTest.compute[{}]'.format(method), test.compute)
+    return results
+
+
+def run(sizes=SIZES, tie_rates=(0.1,), censored=(0.3,), groups=(2,), repeat=3, max_object_donors=1e5):
+    """
+    Benchmarks every combination of cohort parameters.
+    :return: json serializable baseline document
+    """
+    results = []
+    for donors in sizes:
+        for tie_rate in tie_rates:
+            for fraction in censored:
+                for count in groups:
+                    results.extend(run_cohort(donors, tie_rate, fraction, count, repeat, max_object_donors))
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def compare(baseline, current, threshold=0.25, min_seconds=0.001):
+    """
+    Finds the stages of current that are slower, or use more memory, than in baseline by more than threshold.
+    :param baseline: baseline document
+    :param current: baseline document of the run to check
+    :param threshold: allowed relative increase
+    :param min_seconds: stages faster than this in both runs are too noisy to compare times
+    :return: list of regression dictionaries, with the cohort parameters, metric, both values and their ratio
+    """
+    previous = dict((tuple(r[k] for k in KEY), r) for r in baseline['results'])
+    regressions = []
+    for record in current['results']:
+        before = previous.get(tuple(record[k] for k in KEY))
+        if before is None:
+            continue
+        for metric in ('seconds', 'peakBytes'):
+            old, new = before[metric], record[metric]
+            if not old:
+                continue
+            if metric == 'seconds' and max(old, new) < min_seconds:
+                continue
+            if new > old * (1 + threshold):
+                regression = dict((k, record[k]) for k in KEY)
+                regression.update(metric=metric, baseline=old, current=new, ratio=new / old)
+                regressions.append(regression)
+    return regressions
+
+
+def _floats(text):
+    return [float(value) for value in text.split(',')]
+
+
+def _ints(text):
+    return [int(float(value)) for value in text.split(',')]
+
+
+def main(argv=None):
+    """
+    Command line entry point. 'run' writes a baseline document, 'compare' exits with status 1 on regressions.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser('run', help='benchmark synthetic cohorts')
+    run_parser.add_argument('--sizes', type=_ints, default=list(SIZES), help='donor counts, e.g. 1e3,1e5,1e7')
+    run_parser.add_argument('--tie-rates', type=_floats, default=[0.1])
+    run_parser.add_argument('--censored', type=_floats, default=[0.3])
+    run_parser.add_argument('--groups', type=_ints, default=[2])
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--max-object-donors', type=float, default=1e5)
+    run_parser.add_argument('--output', help='baseline file, printed when omitted')
+
+    compare_parser = commands.add_parser('compare', help='compare a run against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.25)
+    compare_parser.add_argument('--min-seconds', type=float, default=0.001)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        document = run(args.sizes, args.tie_rates, args.censored, args.groups, args.repeat, args.max_object_donors)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(document, f, indent=1)
+        else:
+            print(json.dumps(document, indent=1))
+        return 0
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.min_seconds)
+        for r in regressions:
+            print('{stage} donors={donors} tieRate={tieRate} censored={censored} groups={groups}: {metric} '
+                  '{baseline:.6g} -> {current:.6g} ({ratio:.2f}x)'.format(**r))
+        return 1 if regressions else 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,9 +17,10 @@ from setuptools import setup, find_packages
 setup(
     name="SurvivalPy",
     version="1.0.2",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
 
-    requires=["future", "scipy"],
+    requires=["future", "numpy"],
+    python_requires=">=3.6",
 
     # metadata for upload to PyPI
     author="andricDu",
@@ -0,0 +1,178 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Asyncio front end. Curves and log-rank tests run in an executor so they do not block the event loop, identical
+requests in flight share one computation, and a bounded number of computations are queued or running at a time.
+Requests are identified by the hash of their columns, as in survivalpy.cache, or by a key given by the caller.
+Requires Python 3.7+.
+"""
+from __future__ import division
+from __future__ import print_function
+import asyncio
+import copy
+import weakref
+from survivalpy.cache import column_key
+from survivalpy.logrank import LogRankTest, _set_counts
+from survivalpy.survival import DatumBatch, _interval_table
+
+
+def _curve_key(batch):
+    return column_key((batch.time, batch.censored), kind='curve')
+
+
+def _curve(batch):
+    """
+    Computes the intervals of a batch, with the order sorting it, so callers with the same columns but other
+    donors can bind the table to their own batch.
+    :return: (batch, order or None, IntervalTable)
+    """
+    order = None if batch.is_sorted() else batch.sort_order()
+    return batch, order, _interval_table(batch if order is None else batch.take(order))
+
+
+def _logrank_key(survival_results, method):
+    columns = []
+    for results in survival_results:
+        times, died, censored, observed = _set_counts(results)
+        columns.extend((times, died, censored, [observed]))
+    return column_key(columns, kind='logrank', method=method, sets=len(survival_results))
+
+
+def _logrank(survival_results, method):
+    return LogRankTest(survival_results, method=method).compute()
+
+
+class Service(object):
+    """
+    Runs curves and log-rank tests in an executor on behalf of coroutines. At most max_pending computations, key
+    hashing included, are queued or running in the executor; other requests wait for a slot, and once max_waiting
+    requests are waiting new ones are rejected with asyncio.QueueFull.
+
+    A Service belongs to the event loop it is first used in.
+    """
+
+    def __init__(self, executor=None, max_pending=8, max_waiting=None):
+        """
+        Constructor
+        :param executor: concurrent.futures executor, defaults to the loop's default thread pool. A process pool
+            also works since the computations are module level functions of picklable arguments.
+        :param max_pending: maximum number of computations submitted to the executor at a time
+        :param max_waiting: maximum number of requests waiting for a slot, None for no limit
+        """
+        self.executor = executor
+        self.max_pending = max_pending
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self._slots = None
+        self._inflight = {}
+
+    @property
+    def inflight(self):
+        """
+        Number of distinct computations in flight.
+        """
+        return len(self._inflight)
+
+    async def _run(self, function, *args):
+        """
+        Runs a function in the executor once a slot is free.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        if self._slots.locked():
+            if self.max_waiting is not None and self.waiting >= self.max_waiting:
+                raise asyncio.QueueFull()
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self._slots.release()
+
+    async def _coalesce(self, key, function, *args):
+        """
+        Awaits the computation in flight for key, starting it if there is none. A cancelled caller does not cancel
+        the computation other callers share.
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(function, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def compute_curve(self, data, key=None):
+        """
+        Computes the intervals of a cohort.
+        :param data: list of Datum objects, or a DatumBatch
+        :param key: optional hashable identifying the cohort, defaults to the hash of its time and censored columns
+        :return: An IntervalTable of the donors of data
+        """
+        batch = data if isinstance(data, DatumBatch) else await self._run(DatumBatch.from_data, data)
+        if key is None:
+            key = await self._run(_curve_key, batch)
+        source, order, table = await self._coalesce(('curve', key), _curve, batch)
+        if source is not batch:
+            table = copy.copy(table)
+            table.batch = batch if order is None else batch.take(order)
+        return table
+
+    async def logrank(self, survival_results, method='approximate', key=None):
+        """
+        Runs a log-rank test.
+        :param survival_results: as for LogRankTest
+        :param method: LogRankTest method
+        :param key: optional hashable identifying the request, defaults to the hash of the sets' counts
+        :return: Dictionary with computed results
+        """
+        if key is None:
+            key = await self._run(_logrank_key, survival_results, method)
+        return dict(await self._coalesce(('logrank', method, key), _logrank, survival_results, method))
+
+
+_services = weakref.WeakKeyDictionary()
+
+
+def default_service():
+    """
+    The Service of the running event loop used by the module level functions, created with the default settings on
+    first use.
+    :return: Service
+    """
+    loop = asyncio.get_running_loop()
+    service = _services.get(loop)
+    if service is None:
+        service = _services[loop] = Service()
+    return service
+
+
+async def compute_curve(data, key=None):
+    """
+    Computes the intervals of a cohort with the default service, see Service.compute_curve.
+    """
+    return await default_service().compute_curve(data, key)
+
+
+async def logrank(survival_results, method='approximate', key=None):
+    """
+    Runs a log-rank test with the default service, see Service.logrank.
+    """
+    return await default_service().logrank(survival_results, method, key)
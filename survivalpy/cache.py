@@ -0,0 +1,278 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import division
+from __future__ import print_function
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import tempfile
+import numpy as np
+from survivalpy.logrank import LogRankTest, _set_counts
+from survivalpy.survival import Analyzer, DatumBatch, IntervalTable, _interval_table
+
+
+def column_key(columns, **options):
+    """
+    Stable hash of numpy columns and options, used as cache key.
+    :param columns: iterable of arrays
+    :param options: json like options affecting the result
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    for column in columns:
+        column = np.ascontiguousarray(column)
+        if column.dtype == bool:
+            column = column.view(np.uint8)
+        digest.update('{}{}'.format(column.dtype.str, column.shape).encode('utf-8'))
+        digest.update(column.tobytes() if not column.dtype.hasobject else repr(column.tolist()).encode('utf-8'))
+    digest.update(repr(sorted(options.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _size(value):
+    """
+    Approximate size in bytes of a cached value.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_size(item) for item in value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryCache(object):
+    """
+    In memory least recently used cache, evicting entries once their total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Constructor
+        :param max_bytes: maximum total size of the cached values
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: the cached value, or None
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        :param key: cache key
+        :param value: value to cache, not stored if larger than max_bytes
+        """
+        size = _size(value)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+class DiskCache(object):
+    """
+    Cache storing each value as a pickle file in a directory, optionally evicting the least recently used files once
+    their total size exceeds max_bytes. Files are written atomically, so the directory can be shared by processes.
+    """
+
+    SUFFIX = '.pickle'
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Constructor
+        :param directory: directory of the cache files, created if missing
+        :param max_bytes: maximum total size of the files, or None for no limit
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def __files(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith(self.SUFFIX)]
+
+    def __len__(self):
+        return len(self.__files())
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: the cached value, or None
+        """
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path, None)  # Marks it as recently used
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        :param key: cache key
+        :param value: picklable value to cache
+        """
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temporary, self.__path(key))
+        except Exception:
+            os.remove(temporary)
+            raise
+        if self.max_bytes is not None:
+            self.__evict()
+
+    def __evict(self):
+        files = []
+        for path in self.__files():
+            try:
+                stat = os.stat(path)
+            except OSError:  # Removed by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path in self.__files():
+            os.remove(path)
+
+
+default_cache = MemoryCache()
+
+CURVE_FORMAT = 2  # Version of the cached curve tuples, part of their keys
+
+
+class CachedAnalyzer(Analyzer):
+    """
+    Analyzer whose results are cached by the hash of the time and censored columns. The order sorting the donors is
+    cached with the intervals, so a hit neither sorts nor recomputes anything, and still returns the donors of the
+    data it was given.
+    """
+
+    def __init__(self, data, cache=None):
+        """
+        Constructor
+        :param data: list of Datum objects, or a DatumBatch
+        :param cache: MemoryCache, DiskCache or any object with get(key) and put(key, value), defaults to a shared
+            in memory cache
+        """
+        self.cache = default_cache if cache is None else cache
+        self.unsorted = data if isinstance(data, DatumBatch) else DatumBatch.from_data(data)
+        self.key = column_key((self.unsorted.time, self.unsorted.censored), kind='curve', format=CURVE_FORMAT)
+        self.data = None
+        self.batch = None
+        self.intervals = None
+        self.median = None
+        self._ends = self._survival = None
+
+    def compute_table(self):
+        """
+        Computes, or looks up, the intervals.
+        :return: An IntervalTable
+        """
+        cached = self.cache.get(self.key)
+        if cached is None:
+            order = None if self.unsorted.is_sorted() else self.unsorted.sort_order()
+            self.batch = self.unsorted if order is None else self.unsorted.take(order)
+            table = _interval_table(self.batch)
+            self.cache.put(self.key, (order, table.start, table.end, table.died, table.censored, table.offsets))
+        else:
+            order, start, end, died, censored, offsets = cached
+            self.batch = self.unsorted if order is None else self.unsorted.take(order)
+            table = IntervalTable(start, end, died, censored, offsets, self.batch)
+        self._ends, self._survival, self.median = table.end, table.survival, table.median
+        return table
+
+    def compute(self, max_points=None, donor_sample=None, epsilon=None):
+        """
+        Computes, or looks up, the intervals.
+        :param max_points: as for Analyzer.compute()
+        :param donor_sample: as for Analyzer.compute()
+        :param epsilon: as for Analyzer.compute()
+        :return: A list of intervals
+        """
+        return self._table_intervals(max_points, donor_sample, epsilon)
+
+
+def cached_logrank(survival_results, cache=None, method='approximate'):
+    """
+    Runs, or looks up, a LogRankTest.
+    :param survival_results: as for LogRankTest
+    :param cache: MemoryCache, DiskCache or any object with get(key) and put(key, value), defaults to a shared in
+        memory cache
+    :param method: LogRankTest method
+    :return: Dictionary with computed results
+    """
+    cache = default_cache if cache is None else cache
+    columns = []
+    for results in survival_results:
+        times, died, censored, observed = _set_counts(results)
+        columns.extend((times, died, censored, np.array([observed])))
+    key = column_key(columns, kind='logrank', method=method, sets=len(survival_results))
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = LogRankTest(survival_results, method=method).compute()
+        cache.put(key, stats)
+    return dict(stats)
@@ -0,0 +1,98 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Chi-squared distribution, by a built-in regularized incomplete gamma function. Setting use_scipy to True uses
+scipy.stats instead, imported on first use rather than with the package.
+"""
+from __future__ import division
+from __future__ import print_function
+import math
+
+_EPSILON = 1e-15
+_TINY = 1e-300
+_MAX_ITERATIONS = 1000
+use_scipy = False  # Whether sf() uses scipy.stats, which must then be installed
+_scipy_chi2 = []  # scipy.stats.chi2 once imported
+
+
+def sf(x, df):
+    """
+    Survival function 1 - cdf of the chi-squared distribution, accurate for tiny p-values.
+    :param x: chi-squared statistic
+    :param df: degrees of freedom
+    :return: float
+    """
+    if use_scipy:
+        if not _scipy_chi2:
+            from scipy.stats import chi2
+            _scipy_chi2.append(chi2)
+        return float(_scipy_chi2[0].sf(x, df))
+    return builtin_sf(x, df)
+
+
+def builtin_sf(x, df):
+    """
+    Survival function of the chi-squared distribution, without scipy.
+    :param x: chi-squared statistic
+    :param df: degrees of freedom
+    :return: float
+    """
+    if df <= 0 or math.isnan(x):
+        return float('nan')
+    return _upper_gamma(df / 2, x / 2)
+
+
+def _upper_gamma(a, x):
+    """
+    Regularized upper incomplete gamma function Q(a, x), by series for small x and by continued fraction otherwise
+    (Numerical Recipes 6.2).
+    """
+    if x <= 0:
+        return 1.0
+    scale = math.exp(a * math.log(x) - x - math.lgamma(a))
+
+    if x < a + 1:
+        # Series for the lower function P, Q is not small here so 1 - P keeps its precision
+        term = total = 1 / a
+        n = a
+        for _ in range(_MAX_ITERATIONS):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * _EPSILON:
+                break
+        return max(0.0, 1 - total * scale)
+
+    # Modified Lentz continued fraction for Q
+    b = x + 1 - a
+    c = 1 / _TINY
+    d = 1 / b
+    h = d
+    for i in range(1, _MAX_ITERATIONS):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        if abs(d) < _TINY:
+            d = _TINY
+        c = b + an / c
+        if abs(c) < _TINY:
+            c = _TINY
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < _EPSILON:
+            break
+    return scale * h
@@ -0,0 +1,135 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Opt-in instrumentation of the hot paths. Nothing is recorded unless a Recorder is active:
+
+    with Recorder(callback=metrics.emit) as recorder:
+        results = Analyzer(data).compute()
+    recorder.totals()
+
+Each instrumented stage reports an event with its name, wall time, number of elements and size in bytes of the
+arrays it allocated, when known. Recorders are process wide, so stages run by other threads while a recorder is
+active are recorded too. While none is active, a stage costs one function call returning a shared no-op object.
+"""
+from __future__ import division
+from __future__ import print_function
+from collections import OrderedDict
+from timeit import default_timer
+
+_recorders = []
+
+
+class _NoStage(object):
+    """
+    Stage returned while no recorder is active.
+    """
+    __slots__ = ()
+
+    def done(self, count=None, nbytes=None):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class _Stage(object):
+    """
+    A running stage, reported to the active recorders when done.
+    """
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = default_timer()
+
+    def done(self, count=None, nbytes=None):
+        """
+        Ends the stage and reports it.
+        :param count: number of elements processed or produced
+        :param nbytes: size in bytes of the arrays allocated
+        """
+        event = {'stage': self.name, 'seconds': default_timer() - self.started, 'count': count, 'bytes': nbytes}
+        for recorder in list(_recorders):
+            recorder.record(event)
+
+
+def stage(name):
+    """
+    Starts timing a stage. Call done() on the returned object when it ends.
+    :param name: stage name
+    :return: stage object
+    """
+    if not _recorders:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def nbytes(*arrays):
+    """
+    Total size of numpy arrays, ignoring None.
+    :return: int
+    """
+    return sum(array.nbytes for array in arrays if array is not None)
+
+
+class Recorder(object):
+    """
+    Collects the events of the instrumented stages while active, as a context manager or between start() and
+    stop(), and passes each event to an optional callback.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Constructor
+        :param callback: optional function called with each event dictionary of 'stage', 'seconds', 'count' and
+            'bytes', the latter two None when not known
+        """
+        self.callback = callback
+        self.events = []
+
+    def start(self):
+        _recorders.append(self)
+        return self
+
+    def stop(self):
+        _recorders.remove(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def record(self, event):
+        self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def totals(self):
+        """
+        Events summed per stage, in the order stages first ran.
+        :return: dictionary of stage -> dictionary of 'calls', 'seconds', 'count' and 'bytes'
+        """
+        totals = OrderedDict()
+        for event in self.events:
+            total = totals.get(event['stage'])
+            if total is None:
+                total = totals[event['stage']] = {'calls': 0, 'seconds': 0, 'count': 0, 'bytes': 0}
+            total['calls'] += 1
+            total['seconds'] += event['seconds']
+            total['count'] += event['count'] or 0
+            total['bytes'] += event['bytes'] or 0
+        return totals
@@ -0,0 +1,151 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Binary cohort files, memory mapped for zero-copy loading.
+
+Layout, little-endian:
+    header     64 bytes: magic b'SPYCOHRT', uint32 version, uint32 flags, uint64 count, then the uint64 offsets of
+               the times, events and metadata sections (0 when there is no metadata), zero padded
+    times      count float64
+    events     count bits, packed least significant bit first, set where the donor died
+    metadata   optional, 8 byte aligned: count + 1 uint64 offsets relative to the end of the offsets, followed by one
+               utf-8 json document per donor
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import json
+import struct
+import numpy as np
+from survivalpy.survival import DatumBatch
+
+MAGIC = b'SPYCOHRT'
+VERSION = 1
+HAS_META = 1
+_HEADER = struct.Struct('<8sIIQQQQ')
+_HEADER_SIZE = 64
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+class CohortMeta(object):
+    """
+    Metadata table of a cohort file, decoding the json of a donor when it is looked up.
+    """
+    __slots__ = ('offsets', 'blob')
+
+    def __init__(self, offsets, blob):
+        """
+        Constructor
+        :param offsets: count + 1 offsets into blob
+        :param blob: bytes like json documents
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return json.loads(self.blob[int(self.offsets[row]):int(self.offsets[row + 1])].tobytes().decode('utf-8'))
+
+
+def write_cohort(path, times, events, meta=None):
+    """
+    Writes a cohort file.
+    :param path: file path
+    :param times: sequence of numeric times
+    :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+    :param meta: optional sequence of json serializable metadata, one per donor
+    """
+    times = np.ascontiguousarray(times, dtype='<f8')
+    events = np.asarray(events, dtype=bool)
+    if len(events) != len(times) or (meta is not None and len(meta) != len(times)):
+        raise ValueError('Columns of a cohort must have the same length')
+
+    packed = np.packbits(events.astype(np.uint8), bitorder='little')
+    events_offset = _HEADER_SIZE + times.nbytes
+    meta_offset = _align(events_offset + packed.nbytes) if meta is not None else 0
+
+    with open(path, 'wb') as f:
+        header = _HEADER.pack(MAGIC, VERSION, HAS_META if meta is not None else 0, len(times), _HEADER_SIZE,
+                              events_offset, meta_offset)
+        f.write(header.ljust(_HEADER_SIZE, b'\0'))
+        f.write(times.tobytes())
+        f.write(packed.tobytes())
+        if meta is not None:
+            documents = [json.dumps(m).encode('utf-8') for m in meta]
+            offsets = np.concatenate(([0], np.cumsum([len(d) for d in documents]))).astype('<u8')
+            f.write(b'\0' * (meta_offset - events_offset - packed.nbytes))
+            f.write(offsets.tobytes())
+            f.write(b''.join(documents))
+
+
+def open_cohort(path):
+    """
+    Memory maps a cohort file. Times and metadata are views of the file; only the events are unpacked in memory,
+    one byte per donor.
+    :param path: file path
+    :return: a DatumBatch, accepted by Analyzer and LogRankTest
+    """
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(mapped) < _HEADER_SIZE:
+        raise ValueError('Not a cohort file: {}'.format(path))
+    magic, version, flags, count, times_offset, events_offset, meta_offset = \
+        _HEADER.unpack(mapped[:_HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise ValueError('Not a cohort file: {}'.format(path))
+    if version != VERSION:
+        raise ValueError('Unsupported cohort file version: {}'.format(version))
+
+    times_end = times_offset + 8 * count
+    events_end = events_offset + (count + 7) // 8
+    end = events_end
+    if flags & HAS_META:
+        end = meta_offset + 8 * (count + 1)
+        if meta_offset < events_end:
+            raise ValueError('Truncated cohort file')
+    if not _HEADER_SIZE <= times_offset <= times_end <= events_offset <= events_end <= end <= len(mapped):
+        raise ValueError('Truncated cohort file')
+
+    times = mapped[times_offset:times_end].view('<f8')
+    packed = mapped[events_offset:events_end]
+    censored = np.unpackbits(packed, count=count, bitorder='little') == 0
+
+    meta = None
+    if flags & HAS_META:
+        offsets = mapped[meta_offset:end].view('<u8')
+        blob = mapped[end:]
+        if offsets[0] != 0 or offsets[-1] > len(blob):
+            raise ValueError('Truncated cohort file')
+        meta = CohortMeta(offsets, blob)
+    return DatumBatch(times, censored, meta=meta)
+
+
+def convert_json(source, path):
+    """
+    Converts donors in the json shape of Datum.to_json_dict() to a cohort file.
+    :param source: path of a json file holding a list of {"time", "censored", "meta"} objects
+    :param path: path of the cohort file to write
+    """
+    with open(source) as f:
+        donors = json.load(f)
+    write_cohort(path,
+                 [donor['time'] for donor in donors],
+                 [not donor['censored'] for donor in donors],
+                 [donor.get('meta') for donor in donors])
@@ -16,9 +16,114 @@
 from __future__ import division
 from __future__ import print_function
 from collections import OrderedDict
-from functools import reduce
+from itertools import chain
 import math
-from scipy import stats
+import numpy as np
+from survivalpy import chi2, instrument
+from survivalpy.survival import DatumBatch, IncrementalAnalyzer, IntervalTable, StreamingAnalyzer
+
+
+def _set_counts(results):
+    """
+    Deaths and censorings of one survival result set, with one row per donor or per time.
+    :param results: Interval list, IntervalTable, DatumBatch, StreamingAnalyzer or IncrementalAnalyzer
+    :return: (times, died, censored, total observed deaths)
+    """
+    if isinstance(results, IntervalTable):
+        if results.batch is None:
+            raise ValueError('IntervalTable has no donors, pass the StreamingAnalyzer or IncrementalAnalyzer it was '
+                             'computed from instead')
+        results = results.batch
+    if isinstance(results, (StreamingAnalyzer, IncrementalAnalyzer)):
+        times, died, censored = results.counts()
+        return times, died, censored, int(died.sum())
+    if isinstance(results, DatumBatch):
+        return results.time, ~results.censored, results.censored, int(np.count_nonzero(~results.censored))
+    data = list(chain.from_iterable(interval.data for interval in results))
+    if any(len(interval.data) != interval.died + interval.get_censored() for interval in results):
+        raise ValueError('Intervals are missing donors, e.g. computed with donor_sample or by a StreamingAnalyzer. '
+                         'Pass intervals with all their donors, or the StreamingAnalyzer or IncrementalAnalyzer itself')
+    batch = DatumBatch([datum.time for datum in data], [datum.censored for datum in data])
+    return batch.time, ~batch.censored, batch.censored, sum(map(lambda interval: interval.died, results))
+
+
+def _count_matrices(counts):
+    """
+    Counts deaths and censorings per distinct time and set. Each set is counted with numpy, so construction is
+    n log n in the number of donors.
+    :param counts: list of (times, died, censored) arrays, one per set, with one row per donor or per time
+    :return: (sorted distinct times, died matrix, censored matrix), matrices are times x sets
+    """
+    num_sets = len(counts)
+    if counts:
+        times, died, censored = (np.concatenate(column) for column in zip(*counts))
+    else:
+        times, died, censored = np.zeros(0), np.zeros(0), np.zeros(0)
+    labels = np.repeat(np.arange(num_sets), [len(c[0]) for c in counts])
+
+    distinct, index = np.unique(times, return_inverse=True)
+    cells = index.ravel() * num_sets + labels
+    shape = (len(distinct), num_sets)
+    died = np.bincount(cells, weights=died, minlength=shape[0] * shape[1]).astype(np.int64).reshape(shape)
+    censored = np.bincount(cells, weights=censored, minlength=shape[0] * shape[1]).astype(np.int64).reshape(shape)
+    return distinct, died, censored
+
+
+class _SparseCounts(object):
+    """
+    Deaths and censorings per distinct time and set in compressed sparse row layout: the nonzero cells of time k are
+    indptr[k]..indptr[k+1], with their set in sets. Memory scales with the nonzero cells rather than times x sets.
+    """
+    __slots__ = ('times', 'indptr', 'sets', 'died', 'censored', 'num_sets')
+
+    def __init__(self, times, died, censored, labels, num_sets):
+        """
+        Constructor
+        :param times: array of times, one row per donor or per count
+        :param died: array of deaths per row
+        :param censored: array of censorings per row
+        :param labels: array of the set of each row, in range(num_sets)
+        :param num_sets: number of sets
+        """
+        self.times, index = np.unique(times, return_inverse=True)
+        cells, index = np.unique(index.ravel() * num_sets + labels, return_inverse=True)
+        index = index.ravel()
+        self.num_sets = num_sets
+        self.sets = cells % num_sets if num_sets else cells
+        self.died = np.bincount(index, weights=died, minlength=len(cells)).astype(np.int64)
+        self.censored = np.bincount(index, weights=censored, minlength=len(cells)).astype(np.int64)
+        per_time = np.bincount(cells // max(num_sets, 1), minlength=len(self.times))
+        self.indptr = np.concatenate(([0], np.cumsum(per_time))).astype(np.intp)
+
+    def __len__(self):
+        return len(self.times)
+
+    def dense(self, lo=0, hi=None):
+        """
+        Dense counts of times [lo, hi).
+        :return: (died, censored) matrices, times x sets
+        """
+        hi = len(self.times) if hi is None else hi
+        first, last = self.indptr[lo], self.indptr[hi]
+        rows = np.repeat(np.arange(hi - lo), np.diff(self.indptr[lo:hi + 1]))
+        died = np.zeros((hi - lo, self.num_sets), dtype=np.int64)
+        censored = np.zeros((hi - lo, self.num_sets), dtype=np.int64)
+        died[rows, self.sets[first:last]] = self.died[first:last]
+        censored[rows, self.sets[first:last]] = self.censored[first:last]
+        return died, censored
+
+    def chunks(self, hi=None, cells=1 << 20):
+        """
+        Dense counts of times [0, hi), a block of times at a time so that each block has about cells cells.
+        :return: generator of (died, censored) matrices
+        """
+        hi = len(self.times) if hi is None else hi
+        step = max(1, cells // max(self.num_sets, 1))
+        for lo in range(0, hi, step):
+            yield self.dense(lo, min(lo + step, hi))
+
+    def nbytes(self):
+        return instrument.nbytes(self.times, self.indptr, self.sets, self.died, self.censored)
 
 
 class LogRankTest:
@@ -26,82 +131,360 @@ class LogRankTest:
     Performs a Log-Rank test of significance for provided survival results
     http://www.mas.ncl.ac.uk/~njnsm/medfac/docs/surv.pdf - http://www.ncbi.nlm.nih.gov/pmc/articles/PMC3059453/
     Port of: SurvivalLogRank.java from https://github.com/icgc-dcc/dcc-portal
+
+    The default 'approximate' method computes sum((O-E)^2/E) like the original port. The 'exact' method uses the
+    hypergeometric variance-covariance matrix of O-E and its quadratic form, vectorized over times and sets.
+
+    Counts are kept per time in a sparse layout and only expanded to times x sets a block of times at a time, so
+    tests of many sets, e.g. from_labels() with hundreds of groups, need memory for the nonzero counts only.
     """
 
-    def __init__(self, survival_results):
+    METHODS = ('approximate', 'exact')
+
+    def __init__(self, survival_results, method='approximate'):
         """
         Constructor for LogRankTest. Takes a list of survival result sets. Initializes with total pop and observed.
-        :param survival_results: A list of Interval lists.
+        :param survival_results: A list of Interval lists, IntervalTables, DatumBatches, StreamingAnalyzers or
+            IncrementalAnalyzers.
+        :param method: 'approximate' or 'exact'
         """
-        self.num_sets = len(survival_results)
-        self.set_totals = []
-        self.total_observed = []
-        self.largest_time = 0
-        for results in survival_results:
-            self.set_totals.append(sum(map(lambda interval: len(interval.data), results)))
-            self.total_observed.append(sum(map(lambda interval: interval.died, results)))
-        self.samples = self.__construct_sample_map(survival_results)
+        stage = instrument.stage('LogRankTest.counts')
+        counts = [_set_counts(results) for results in survival_results]
+        if counts:
+            times, died, censored = (np.concatenate(column) for column in list(zip(*counts))[:3])
+        else:
+            times, died, censored = np.zeros(0), np.zeros(0), np.zeros(0)
+        labels = np.repeat(np.arange(len(counts)), [len(c[0]) for c in counts])
+        self.labels = None
+        self.__setup(method, _SparseCounts(times, died, censored, labels, len(counts)), [c[3] for c in counts])
+        stage.done(count=len(self.times), nbytes=self.counts.nbytes())
 
-    def __construct_sample_map(self, survival_results):
+    @classmethod
+    def from_labels(cls, times, events, labels, method='approximate'):
         """
-        Constructs an ordered dict of time -> ([died columns], [censored columns])
-        :param survival_results: list of interval lists
-        :return: Sample Map
+        Alternate constructor taking one row per donor of all sets, with the set of each donor, instead of one
+        survival result set per group.
+        :param times: sequence of times
+        :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+        :param labels: sequence of group labels, one set per distinct label in sorted order
+        :param method: 'approximate' or 'exact'
+        :return: a LogRankTest
         """
-        samples = OrderedDict()
+        stage = instrument.stage('LogRankTest.counts')
+        events = np.asarray(events, dtype=bool)
+        groups, labels = np.unique(labels, return_inverse=True)
+        labels = labels.ravel()
+        test = cls.__new__(cls)
+        test.labels = groups
+        observed = np.bincount(labels[events], minlength=len(groups)).tolist()
+        test.__setup(method, _SparseCounts(np.asarray(times), events, ~events, labels, len(groups)), observed)
+        stage.done(count=len(test.times), nbytes=test.counts.nbytes())
+        return test
 
-        for i in range(0, self.num_sets):
-            result = survival_results[i]
-            result_data = reduce(list.__add__, map(lambda interval: interval.data, result))
+    def __setup(self, method, counts, observed):
+        if method not in self.METHODS:
+            raise ValueError('Unknown log-rank method: {}'.format(method))
+        self.method = method
+        self.counts = counts
+        self.num_sets = counts.num_sets
+        self.times = counts.times
+        totals = np.bincount(counts.sets, weights=counts.died + counts.censored, minlength=self.num_sets)
+        self.set_totals = totals.astype(np.int64).tolist()
+        self.total_observed = observed
 
-            for datum in result_data:
-                time = datum.time
-                sample = samples.get(time)
-                if sample is None:
-                    sample = ([0]*self.num_sets, [0]*self.num_sets)  # ([died], [censored])
+        cell_times = np.repeat(self.times, np.diff(counts.indptr))
+        death_times = cell_times[counts.died > 0]
+        self.largest_time = max(death_times.max().item(), 0) if len(death_times) else 0
+        self._dense = None
+        self._samples = None
 
-                if datum.censored:
-                    sample[1][i] += 1
-                else:
-                    if time > self.largest_time:
-                        self.largest_time = time
-                    sample[0][i] += 1
+    def __dense_counts(self):
+        if self._dense is None:
+            self._dense = self.counts.dense()
+        return self._dense
 
-                samples.__setitem__(time, sample)
+    @property
+    def died(self):
+        """
+        Deaths per time and set, a dense times x sets view for inspecting small tests. It is built on first access
+        and kept; compute() does not use it.
+        :return: dense times x sets matrix
+        """
+        return self.__dense_counts()[0]
 
-        return OrderedDict(sorted(samples.items()))
+    @property
+    def censored(self):
+        """
+        Censorings per time and set, a dense times x sets view like died.
+        :return: dense times x sets matrix
+        """
+        return self.__dense_counts()[1]
+
+    @property
+    def samples(self):
+        """
+        Ordered dict of time -> ([died columns], [censored columns]), built on first access and kept. It has an entry
+        per time and set, so it is only meant for inspecting small tests; compute() does not use it.
+        :return: Sample Map
+        """
+        if self._samples is None:
+            stage = instrument.stage('LogRankTest.samples')
+            died, censored = self.__dense_counts()
+            self._samples = OrderedDict(zip(self.times.tolist(), zip(died.tolist(), censored.tolist())))
+            stage.done(count=len(self._samples))
+        return self._samples
+
+    def __expected(self, hi=None, covariance=False):
+        """
+        Sums expected deaths per set, and optionally their covariance matrix, over times [0, hi) a block at a time.
+        :return: (expected deaths, covariance or None)
+        """
+        remaining = np.asarray(self.set_totals)
+        expected = np.zeros(self.num_sets)
+        total_covariance = np.zeros((self.num_sets, self.num_sets)) if covariance else None
+        for died, censored in self.counts.chunks(hi):
+            share, block_expected, total_at_risk = _expected(died, censored, remaining)
+            expected += block_expected
+            if covariance:
+                total_covariance += _covariance(share, _spread(died, total_at_risk))
+            remaining = remaining - (died + censored).sum(axis=0)
+        return expected, total_covariance
 
     def compute(self):
         """
         Runs the log rank test and returns a dictionary containing the computed info
         :return: Dictionary with computed results
         """
+        if self.method == 'exact':
+            return self.__compute_exact()
 
-        alive = list(self.set_totals)  # At the start, everyone assumed to be is alive.
-        expected_sums = [0] * self.num_sets
-
-        for time, sample in self.samples.items():
-            if time > self.largest_time:
-                break
-
-            died = sample[0]
-            censored = sample[1]
-
-            total_died = sum(died)
-            total_alive = sum(alive)
-
-            for i in range(0, self.num_sets):
-                expected = total_died * (alive[i] / total_alive)
-                expected_sums[i] += expected
-                alive[i] = alive[i] - died[i] - censored[i]
+        stage = instrument.stage('LogRankTest.compute')
+        # Times after the last death expect no deaths
+        expected_sums = self.__expected(np.searchsorted(self.times, self.largest_time, side='right'))[0].tolist()
 
         chi_squared = 0
         for i in range(0, self.num_sets):
             chi_squared += math.pow(self.total_observed[i] - expected_sums[i], 2) / expected_sums[i]
-        p_value = 1 - stats.chi2.cdf(chi_squared, self.num_sets - 1)
+        p_value = chi2.sf(chi_squared, self.num_sets - 1)
+        stage.done(count=len(self.times))
+
+        return {
+            'chiSquared': chi_squared,
+            'degreesFreedom': self.num_sets - 1,
+            'pValue': p_value
+        }
+
+    def __compute_exact(self):
+        """
+        Log rank test using the exact variance-covariance matrix of observed minus expected deaths.
+        :return: Dictionary with computed results
+        """
+        stage = instrument.stage('LogRankTest.compute')
+        if self.num_sets < 2:
+            chi_squared = 0.0
+        else:
+            expected, covariance = self.__expected(covariance=True)
+            chi_squared = float(_quadratic_form(np.asarray(self.total_observed) - expected, covariance))
+        p_value = chi2.sf(chi_squared, self.num_sets - 1)
+        stage.done(count=len(self.times))
 
         return {
             'chiSquared': chi_squared,
             'degreesFreedom': self.num_sets - 1,
             'pValue': p_value
         }
+
+
+def _expected(died, censored, totals):
+    """
+    Shares of the sets in the risk set at each time, and expected deaths per set, vectorized over leading axes.
+    :param died: (..., times, sets) deaths
+    :param censored: (..., times, sets) censorings
+    :param totals: (..., sets) donors per set
+    :return: (share (..., times, sets), expected deaths (..., sets), total at risk (..., times))
+    """
+    removed = died + censored
+    # At risk at each time: everyone not removed at an earlier time
+    at_risk = totals[..., None, :] - (np.cumsum(removed, axis=-2) - removed)
+    total_at_risk = at_risk.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(total_at_risk[..., None] > 0, at_risk / total_at_risk[..., None], 0)
+    expected = (died.sum(axis=-1)[..., None] * share).sum(axis=-2)
+    return share, expected, total_at_risk
+
+
+def _approximate_chi_squared(died, censored, totals, observed):
+    """
+    The sum((O-E)^2/E) statistic, vectorized over leading axes.
+    :param died: (..., times, sets) deaths
+    :param censored: (..., times, sets) censorings
+    :param totals: (..., sets) donors per set
+    :param observed: (..., sets) observed deaths per set
+    :return: (...) chi-squared statistics
+    """
+    expected = _expected(died, censored, totals)[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(expected > 0, (observed - expected) ** 2 / expected, 0).sum(axis=-1)
+
+
+def _spread(died, total_at_risk):
+    """
+    Hypergeometric variance factor d * (n - d) / (n - 1) of the deaths at each time.
+    :param died: (..., times, sets) deaths
+    :param total_at_risk: (..., times) total at risk
+    :return: (..., times) factors
+    """
+    total_died = died.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total_at_risk > 1, total_died * (total_at_risk - total_died) / (total_at_risk - 1), 0)
+
+
+def _covariance(share, spread):
+    """
+    Variance-covariance matrix of observed minus expected deaths, vectorized over leading axes.
+    :param share: (..., times, sets) shares of the risk set
+    :param spread: (..., times) variance factors, times any squared weights
+    :return: (..., sets, sets) matrices
+    """
+    weighted = share * spread[..., None]
+    return np.eye(share.shape[-1]) * weighted.sum(axis=-2)[..., None, :] - \
+        np.swapaxes(weighted, -1, -2) @ share
+
+
+def _quadratic_form(deviation, covariance):
+    """
+    Chi-squared statistic of deviations and their covariance. The sets' deviations sum to zero, so the last one is
+    dropped.
+    :param deviation: (..., sets) deviations
+    :param covariance: (..., sets, sets) covariance matrices
+    :return: (...) statistics
+    """
+    deviation = deviation[..., :-1]
+    inverse = np.linalg.pinv(covariance[..., :-1, :-1])
+    return np.einsum('...g,...gh,...h->...', deviation, inverse, deviation)
+
+
+def _exact_chi_squared(died, censored, totals, observed):
+    """
+    Log rank statistic using the exact hypergeometric variance-covariance matrix of observed minus expected deaths,
+    vectorized over leading axes.
+    :param died: (..., times, sets) deaths
+    :param censored: (..., times, sets) censorings
+    :param totals: (..., sets) donors per set
+    :param observed: (..., sets) observed deaths per set
+    :return: (...) chi-squared statistics
+    """
+    if died.shape[-1] < 2:
+        return np.zeros(died.shape[:-2])
+    share, expected, total_at_risk = _expected(died, censored, totals)
+    covariance = _covariance(share, _spread(died, total_at_risk))
+    return _quadratic_form(observed - expected, covariance)
+
+
+WEIGHTS = ('logrank', 'wilcoxon', 'tarone-ware')
+
+
+def _weight_name(weight):
+    """
+    :param weight: a name of WEIGHTS, or a (p, q) tuple for the Fleming-Harrington weights
+    :return: the key of the weight's results
+    """
+    if isinstance(weight, tuple):
+        return 'fleming-harrington({}, {})'.format(*weight)
+    if weight not in WEIGHTS:
+        raise ValueError('Unknown log-rank weight: {}'.format(weight))
+    return weight
+
+
+def _time_weights(weight, total_at_risk, survival):
+    """
+    Weights of each time of a weighted log-rank test.
+    :param weight: a name of WEIGHTS, or a (p, q) tuple for the Fleming-Harrington weights
+    :param total_at_risk: (..., times) total at risk
+    :param survival: (..., times) pooled Kaplan-Meier survival just before each time
+    :return: (..., times) weights
+    """
+    if isinstance(weight, tuple):
+        p, q = weight
+        return survival ** p * (1 - survival) ** q
+    if weight == 'wilcoxon':
+        return total_at_risk.astype(float)
+    if weight == 'tarone-ware':
+        return np.sqrt(total_at_risk)
+    return np.ones(total_at_risk.shape)
+
+
+class WeightedLogRankTest:
+    """
+    Weighted and stratified log-rank tests of the same sets of survival results. The deaths, censorings and risk sets
+    of every stratum and set are counted once, and every weight is evaluated from those counts:
+
+    - 'logrank': 1, the exact log-rank test
+    - 'wilcoxon': number at risk, the Gehan-Breslow generalized Wilcoxon test
+    - 'tarone-ware': square root of the number at risk
+    - (p, q): S(t-) ** p * (1 - S(t-)) ** q, the Fleming-Harrington test, with S the pooled Kaplan-Meier survival of
+      the stratum
+
+    Scores and variances are summed over strata before forming the statistic.
+    """
+
+    def __init__(self, survival_results=None, strata=None):
+        """
+        Constructor for WeightedLogRankTest. Takes either one list of survival result sets, or a list of strata each
+        with its own list of result sets, in the same order in every stratum.
+        :param survival_results: A list of Interval lists, IntervalTables, DatumBatches, StreamingAnalyzers or
+            IncrementalAnalyzers.
+        :param strata: A list of such lists, one per stratum
+        """
+        if (survival_results is None) == (strata is None):
+            raise ValueError('Pass either survival_results or strata')
+        strata = [survival_results] if strata is None else [list(stratum) for stratum in strata]
+        self.num_sets = len(strata[0]) if strata else 0
+        if any(len(stratum) != self.num_sets for stratum in strata):
+            raise ValueError('Every stratum must have the same number of result sets')
+        self.num_strata = len(strata)
+
+        stage = instrument.stage('WeightedLogRankTest.counts')
+        counts = [_set_counts(results)[:3] for stratum in strata for results in stratum]
+        self.times, died, censored = _count_matrices(counts)
+        shape = (len(self.times), self.num_strata, self.num_sets)
+        # strata x times x sets
+        self.died = died.reshape(shape).transpose(1, 0, 2)
+        self.censored = censored.reshape(shape).transpose(1, 0, 2)
+        totals = (self.died + self.censored).sum(axis=1)
+
+        self.share, _, self.at_risk = _expected(self.died, self.censored, totals)
+        self.spread = _spread(self.died, self.at_risk)
+        total_died = self.died.sum(axis=-1)
+        self.deviation = self.died - total_died[..., None] * self.share
+        with np.errstate(divide='ignore', invalid='ignore'):
+            multiplier = np.where(self.at_risk > 0, 1 - total_died / self.at_risk, 1)
+        survival = np.cumprod(multiplier, axis=-1)
+        self.survival = np.concatenate((np.ones((self.num_strata, 1)), survival[:, :-1]), axis=1)
+        stage.done(count=len(self.times), nbytes=instrument.nbytes(self.died, self.censored, self.share, self.at_risk,
+                                                                   self.spread, self.deviation, self.survival))
+
+    def compute(self, weights=WEIGHTS):
+        """
+        Runs the tests and returns a dictionary of the computed info of each weight
+        :param weights: names of WEIGHTS, or (p, q) tuples for Fleming-Harrington weights
+        :return: Dictionary of weight name -> dictionary with computed results
+        """
+        stage = instrument.stage('WeightedLogRankTest.compute')
+        stats = OrderedDict()
+        for weight in weights:
+            name = _weight_name(weight)
+            if self.num_sets < 2:
+                chi_squared = 0.0
+            else:
+                w = _time_weights(weight, self.at_risk, self.survival)
+                score = (w[..., None] * self.deviation).sum(axis=(0, 1))
+                covariance = _covariance(self.share, w ** 2 * self.spread).sum(axis=0)
+                chi_squared = float(_quadratic_form(score, covariance))
+            stats[name] = {
+                'chiSquared': chi_squared,
+                'degreesFreedom': self.num_sets - 1,
+                'pValue': chi2.sf(chi_squared, self.num_sets - 1)
+            }
+        stage.done(count=len(stats))
+        return stats
@@ -0,0 +1,179 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Process pool execution of batch curves and pairwise log-rank tests. Columns are copied once into shared memory that
+the workers attach to, instead of pickling Datum lists for every task. Requires Python 3.8+.
+"""
+from __future__ import division
+from __future__ import print_function
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from multiprocessing import shared_memory
+import os
+import numpy as np
+from survivalpy.logrank import LogRankTest
+from survivalpy.survival import DatumBatch, IntervalTable, _group_segments, _interval_table
+
+_shared = {}  # Arrays attached by a worker process, by name
+_blocks = []  # Shared memory blocks backing them, kept open for the life of the worker
+
+
+class _SharedArrays(object):
+    """
+    Context manager copying numpy arrays into shared memory blocks, which are released on exit.
+    """
+
+    def __init__(self, **arrays):
+        """
+        Constructor
+        :param arrays: numeric numpy arrays by name
+        """
+        self.blocks = []
+        self.specs = {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                if array.dtype.hasobject:
+                    raise ValueError('Cannot share non numeric column: {}'.format(name))
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+                self.specs[name] = (block.name, array.dtype.str, array.shape)
+        except Exception:
+            self.__exit__()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def _attach(specs):
+    """
+    Pool initializer attaching the worker to the shared arrays.
+    :param specs: name -> (block name, dtype, shape)
+    """
+    for name, (block_name, dtype, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)
+        _shared[name] = np.ndarray(shape, dtype, buffer=block.buf)
+
+
+def _chunks(items, workers):
+    """
+    Splits items into about four chunks per worker, keeping their order.
+    :param items: list
+    :param workers: number of workers
+    :return: list of lists
+    """
+    size = max(1, -(-len(items) // (workers * 4)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _run(specs, function, tasks, workers, *args):
+    """
+    Runs function over chunks of tasks in a process pool attached to the shared arrays.
+    :return: list of results, in the order of tasks
+    """
+    if not tasks:
+        return []
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+        futures = [pool.submit(function, chunk, *args) for chunk in _chunks(tasks, workers)]
+        return list(chain.from_iterable(future.result() for future in futures))
+
+
+def _interval_columns(segments):
+    """
+    Worker: computes the intervals of some groups.
+    :param segments: list of (lo, hi) ranges of the shared group index
+    :return: list of (start, end, died, censored, offsets) arrays
+    """
+    time, censored, index = _shared['time'], _shared['censored'], _shared['index']
+    results = []
+    for lo, hi in segments:
+        rows = index[lo:hi]
+        table = _interval_table(DatumBatch(time[rows], censored[rows]))
+        results.append((table.start, table.end, table.died, table.censored, table.offsets))
+    return results
+
+
+def compute_many(times, events, groups, ids=None, workers=None):
+    """
+    Parallel Analyzer.compute_many: the universe is sorted once in this process, the curves are computed by a pool
+    of workers.
+    :param times: sequence of numeric times
+    :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+    :param groups: either a groups x donors boolean mask, or one label per donor
+    :param ids: optional sequence of donor ids, exposed as {'id': ...} metadata on the Datum objects
+    :param workers: number of processes, defaults to the number of CPUs
+    :return: A list of IntervalTables, one per mask row or per distinct label in sorted order
+    """
+    batch, index, offsets = _group_segments(times, events, groups, ids)
+    segments = list(zip(offsets[:-1], offsets[1:]))
+    with _SharedArrays(time=batch.time, censored=batch.censored, index=index) as shared:
+        columns = _run(shared.specs, _interval_columns, segments, workers)
+    return [IntervalTable(*(column + (batch.take(index[lo:hi]),))) for column, (lo, hi) in zip(columns, segments)]
+
+
+def _logrank_pairs(pairs, method):
+    """
+    Worker: runs the log-rank test of some pairs of curves.
+    :param pairs: list of (i, j) curve indices
+    :param method: LogRankTest method
+    :return: list of result dictionaries
+    """
+    time, censored, offsets = _shared['time'], _shared['censored'], _shared['offsets']
+    results = []
+    for pair in pairs:
+        batches = [DatumBatch(time[offsets[k]:offsets[k + 1]], censored[offsets[k]:offsets[k + 1]]) for k in pair]
+        results.append(LogRankTest(batches, method=method).compute())
+    return results
+
+
+def run_logrank_matrix(curves, workers=None, method='approximate'):
+    """
+    Runs the log-rank test between every pair of curves in a pool of workers.
+    :param curves: list of Interval lists, IntervalTables or DatumBatches with numeric times
+    :param workers: number of processes, defaults to the number of CPUs
+    :param method: LogRankTest method
+    :return: n x n nested list of result dictionaries, symmetric, with None on the diagonal
+    """
+    batches = []
+    for curve in curves:
+        if isinstance(curve, IntervalTable):
+            curve = curve.batch
+        if not isinstance(curve, DatumBatch):
+            curve = DatumBatch.from_data(chain.from_iterable(interval.data for interval in curve))
+        batches.append(curve)
+
+    offsets = np.concatenate(([0], np.cumsum([len(batch) for batch in batches]))).astype(np.intp)
+    time = np.concatenate([batch.time for batch in batches]) if batches else np.zeros(0)
+    censored = np.concatenate([batch.censored for batch in batches]) if batches else np.zeros(0, dtype=bool)
+    pairs = [(i, j) for i in range(len(batches)) for j in range(i + 1, len(batches))]
+
+    with _SharedArrays(time=time, censored=censored, offsets=offsets) as shared:
+        results = _run(shared.specs, _logrank_pairs, pairs, workers, method)
+
+    matrix = [[None] * len(batches) for _ in batches]
+    for (i, j), stats in zip(pairs, results):
+        matrix[i][j] = matrix[j][i] = stats
+    return matrix
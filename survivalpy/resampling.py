@@ -0,0 +1,133 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Resampling on the columnar representation: bootstrap confidence bands of a Kaplan-Meier curve and permutation
+p-values of the log-rank test. Replicates are drawn as weight or label matrices, a chunk of replicates at a time to
+bound memory, and each chunk is computed in one vectorized pass.
+"""
+from __future__ import division
+from __future__ import print_function
+import numpy as np
+from survivalpy.logrank import _approximate_chi_squared, _exact_chi_squared, _set_counts
+from survivalpy.survival import DatumBatch, _interval_table
+
+_STATISTICS = {'approximate': _approximate_chi_squared, 'exact': _exact_chi_squared}
+
+
+def _weighted_cumulative(weights, died, offsets):
+    """
+    Cumulative survival of each interval for weighted donors, following the rules of Analyzer.compute().
+    :param weights: (replicates, donors) weight of each donor, in sorted order
+    :param died: (donors) boolean, True where the donor died
+    :param offsets: row offsets of the intervals
+    :return: (replicates, intervals) cumulative survival
+    """
+    interval_died = np.add.reduceat(weights * died, offsets[:-1], axis=1)
+    interval_size = np.add.reduceat(weights, offsets[:-1], axis=1)
+    at_risk = weights.sum(axis=1)[:, None] - (np.cumsum(interval_size, axis=1) - interval_size) - \
+        (interval_size - interval_died)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        multiplier = np.where(at_risk > 0, (at_risk - interval_died) / at_risk, 1)
+    cumulative = np.ones(interval_died.shape)
+    cumulative[:, 1:] = np.cumprod(multiplier, axis=1)[:, :-1]
+    return cumulative
+
+
+def bootstrap_bands(times, events, replicates=1000, alpha=0.05, seed=None, chunk_size=100):
+    """
+    Pointwise percentile bootstrap confidence bands of the cumulative survival of each interval.
+    :param times: sequence of times
+    :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+    :param replicates: number of bootstrap replicates
+    :param alpha: the bands cover 1 - alpha
+    :param seed: seed of the random generator, for reproducible bands
+    :param chunk_size: replicates computed at once, each needing memory for one weight per donor
+    :return: json serializable dictionary of interval ends, cumulative survival and lower and upper bands
+    """
+    batch = DatumBatch(times, ~np.asarray(events, dtype=bool)).sorted()
+    table = _interval_table(batch)
+    died = ~batch.censored
+    donors = len(batch)
+    random = np.random.default_rng(seed)
+
+    curves = np.empty((replicates, len(table)))
+    if len(table):
+        for lo in range(0, replicates, chunk_size):
+            size = min(chunk_size, replicates - lo)
+            weights = random.multinomial(donors, np.full(donors, 1 / donors), size=size).astype(float)
+            curves[lo:lo + size] = _weighted_cumulative(weights, died, table.offsets)
+
+    return {
+        'end': table.end.tolist(),
+        'cumulativeSurvival': table.cumulative.tolist(),
+        'lower': np.percentile(curves, 100 * alpha / 2, axis=0).tolist() if replicates else [],
+        'upper': np.percentile(curves, 100 * (1 - alpha / 2), axis=0).tolist() if replicates else [],
+        'replicates': replicates
+    }
+
+
+def permutation_logrank(survival_results, permutations=10000, method='approximate', seed=None, chunk_size=100):
+    """
+    Log-rank test whose p-value is the share of random relabellings of the pooled donors with a statistic at least
+    as large as the observed one, for small samples where the chi-squared approximation is poor.
+    :param survival_results: as for LogRankTest
+    :param permutations: number of random relabellings
+    :param method: statistic, 'approximate' or 'exact' as for LogRankTest
+    :param seed: seed of the random generator, for reproducible p-values
+    :param chunk_size: relabellings computed at once, each needing memory for the times x sets count matrices
+    :return: Dictionary with computed results
+    """
+    if method not in _STATISTICS:
+        raise ValueError('Unknown log-rank method: {}'.format(method))
+    statistic = _STATISTICS[method]
+
+    times, events, labels = [], [], []
+    for label, results in enumerate(survival_results):
+        set_times, died, censored, _ = _set_counts(results)
+        died = np.asarray(died, dtype=np.intp)
+        censored = np.asarray(censored, dtype=np.intp)
+        times.extend((np.repeat(set_times, died), np.repeat(set_times, censored)))
+        events.extend((np.ones(died.sum(), dtype=bool), np.zeros(censored.sum(), dtype=bool)))
+        labels.append(np.full(died.sum() + censored.sum(), label, dtype=np.intp))
+    num_sets = len(labels)
+    distinct, index = np.unique(np.concatenate(times), return_inverse=True)
+    index = index.ravel()
+    events = np.concatenate(events)
+    labels = np.concatenate(labels)
+    totals = np.bincount(labels, minlength=num_sets)
+
+    def statistics(relabelled):
+        cells = (np.arange(len(relabelled))[:, None] * len(distinct) + index) * num_sets + relabelled
+        shape = (len(relabelled), len(distinct), num_sets)
+        died = np.bincount(cells[:, events].ravel(), minlength=np.prod(shape)).reshape(shape)
+        censored = np.bincount(cells[:, ~events].ravel(), minlength=np.prod(shape)).reshape(shape)
+        return statistic(died, censored, totals, died.sum(axis=1))
+
+    observed = float(statistics(labels[None, :])[0])
+    random = np.random.default_rng(seed)
+    exceeding = 0
+    for lo in range(0, permutations, chunk_size):
+        size = min(chunk_size, permutations - lo)
+        relabelled = labels[np.argsort(random.random((size, len(labels))), axis=1)]
+        # Tolerance so that relabellings with the same statistic count despite rounding
+        exceeding += int(np.count_nonzero(statistics(relabelled) >= observed * (1 - 1e-9)))
+
+    return {
+        'chiSquared': observed,
+        'degreesFreedom': num_sets - 1,
+        'pValue': (1 + exceeding) / (1 + permutations),
+        'permutations': permutations
+    }
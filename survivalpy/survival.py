@@ -15,12 +15,19 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from __future__ import print_function
 from __future__ import division
+from bisect import bisect_right
+from itertools import islice
+from operator import attrgetter
+import json
+import numpy as np
+from survivalpy import instrument
 
 
-class Datum:
+class Datum(object):
     """
     Basic unit of data. Contains a time, censored status, and metadata.
     """
+    __slots__ = ('time', 'censored', 'meta')
 
     def __init__(self, time, censored, meta=None):
         """
@@ -33,6 +40,15 @@ class Datum:
         self.censored = censored
         self.meta = meta
 
+    def __getstate__(self):
+        return {'time': self.time, 'censored': self.censored, 'meta': self.meta}
+
+    def __setstate__(self, state):
+        # Also restores pickles written before Datum had __slots__, whose state is the instance __dict__
+        self.time = state.get('time')
+        self.censored = state.get('censored')
+        self.meta = state.get('meta')
+
     def to_json_dict(self):
         """
         Converts the object to json serializable dict
@@ -45,10 +61,11 @@ class Datum:
         }
 
 
-class Interval:
+class Interval(object):
     """
     Interval unit of the Kaplan-Meier curve.
     """
+    __slots__ = ('start', 'end', 'died', 'cumulative', 'variance', 'lower', 'upper', '_data', '_source', '_censored')
 
     def __init__(self, start, end):
         """
@@ -59,17 +76,47 @@ class Interval:
         self.start = start
         self.end = end
         self.died = 0
-        self.data = []
         self.cumulative = 0
+        self.variance = 0  # Greenwood variance of cumulative
+        self.lower = None  # Log-log confidence interval of cumulative
+        self.upper = None
+        self._data = []
+        self._source = None
+        self._censored = 0
+
+    @property
+    def data(self):
+        """
+        Datum objects falling in this interval. Intervals produced from a DatumBatch only build these on first
+        access.
+        :return: list of Datum objects
+        """
+        if self._data is None:
+            batch, lo, hi = self._source
+            self._data = batch.materialize(lo, hi)
+            self._source = None
+        return self._data
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._source = None
+        self._censored = len([datum for datum in data if datum.censored])
 
     def increment_died(self):
         self.died += 1
 
     def add_datum(self, d):
         self.data.append(d)
+        if d.censored:
+            self._censored += 1
 
     def get_censored(self):
-        return len([datum for datum in self.data if datum.censored])
+        """
+        Number of censored donors in the interval, kept up to date by add_datum and by assigning data. Mutating the
+        data list in place bypasses the count.
+        :return: int
+        """
+        return self._censored
 
     def to_json_dict(self):
         """
@@ -82,31 +129,480 @@ class Interval:
             "died": self.died,
             "censored": self.get_censored(),
             "cumulativeSurvival": self.cumulative,
+            "variance": self.variance,
+            "confidenceLower": self.lower,
+            "confidenceUpper": self.upper,
             "donors": [datum.to_json_dict() for datum in self.data]
         }
 
 
-class Analyzer:
+def _donor_dicts(interval, max_donors=None):
+    """
+    Yields the json serializable donors of an interval. Donors of intervals computed from a DatumBatch are read from
+    its columns, without building Datum objects.
+    :param interval: Interval
+    :param max_donors: maximum number of donors, or None for all
+    :return: generator of dictionaries
+    """
+    if interval._data is not None:
+        for datum in islice(interval.data, max_donors):
+            yield datum.to_json_dict()
+        return
+    batch, lo, hi = interval._source
+    if max_donors is not None:
+        hi = min(hi, lo + max_donors)
+    meta = batch.meta
+    rows = batch.row[lo:hi].tolist()
+    for time, censored, row in zip(batch.time[lo:hi].tolist(), batch.censored[lo:hi].tolist(), rows):
+        yield {"time": time, "censored": censored, "meta": None if meta is None else meta[row]}
+
+
+def iter_json(intervals, include_donors=True, max_donors=None, chunk_size=1000):
+    """
+    Encodes intervals as the json array of their to_json_dict(), one chunk at a time, so the output can be written
+    to a file or socket while it is being produced.
+    :param intervals: iterable of Interval objects
+    :param include_donors: whether to include the donors of each interval
+    :param max_donors: maximum number of donors per interval, or None for all
+    :param chunk_size: number of donors encoded per chunk
+    :return: generator of strings
+    """
+    stage = instrument.stage('iter_json')
+    encoder = json.JSONEncoder()
+    yield '['
+    i = -1
+    for i, interval in enumerate(intervals):
+        head = encoder.encode({
+            "start": interval.start,
+            "end": interval.end,
+            "died": interval.died,
+            "censored": interval.get_censored(),
+            "cumulativeSurvival": interval.cumulative,
+            "variance": interval.variance,
+            "confidenceLower": interval.lower,
+            "confidenceUpper": interval.upper
+        })
+        if not include_donors:
+            yield (', ' if i else '') + head
+            continue
+        yield (', ' if i else '') + head[:-1] + ', "donors": ['
+        donors = _donor_dicts(interval, max_donors)
+        separator = ''
+        while True:
+            chunk = [encoder.encode(donor) for donor in islice(donors, chunk_size)]
+            if not chunk:
+                break
+            yield separator + ', '.join(chunk)
+            separator = ', '
+        yield ']}'
+    yield ']'
+    stage.done(count=i + 1)
+
+
+def dump_json(intervals, fp, **options):
+    """
+    Writes intervals to a file object as json, see iter_json.
+    :param intervals: iterable of Interval objects
+    :param fp: file like object with a write method
+    :param options: keyword arguments of iter_json
+    """
+    for chunk in iter_json(intervals, **options):
+        fp.write(chunk)
+
+
+class _IdMeta(object):
+    """
+    Metadata table exposing a column of donor ids as {'id': ...} dictionaries.
+    """
+    __slots__ = ('ids',)
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __getitem__(self, row):
+        return {'id': self.ids[row]}
+
+
+class DatumBatch(object):
+    """
+    Columnar stand-in for a list of Datum objects. Holds a time column, a censored column and, for each row, an index
+    into an external metadata table. Datum objects are only created when explicitly materialized.
+    """
+    __slots__ = ('time', 'censored', '_row', 'meta')
+
+    def __init__(self, time, censored, row=None, meta=None):
+        """
+        Constructor
+        :param time: sequence of times
+        :param censored: sequence of booleans
+        :param row: sequence of indices into meta, defaults to 0..n-1
+        :param meta: indexable metadata table (e.g. a list of dictionaries), or None
+        """
+        self.time = np.asarray(time)
+        self.censored = np.asarray(censored, dtype=bool)
+        self._row = None if row is None else np.asarray(row, dtype=np.intp)
+        self.meta = meta
+
+    @property
+    def row(self):
+        """
+        Index of each row into the metadata table. The default 0..n-1 is only allocated when first used.
+        :return: numpy array
+        """
+        if self._row is None:
+            self._row = np.arange(len(self.time))
+        return self._row
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Builds a batch from Datum objects, keeping their metadata as the external table.
+        :param data: iterable of Datum objects
+        :return: a DatumBatch
+        """
+        data = list(data)
+        return cls([d.time for d in data], [d.censored for d in data], meta=[d.meta for d in data])
+
+    def __len__(self):
+        return len(self.time)
+
+    def sort_order(self):
+        """
+        Order of the rows by time, deaths before censorings at the same time, otherwise keeping their order. This is
+        the order Analyzer uses for Datum lists.
+        :return: index array
+        """
+        return np.lexsort((self.censored, self.time))
+
+    def is_sorted(self):
+        """
+        Whether the rows are already in sort_order(), checked in linear time.
+        :return: boolean
+        """
+        time, censored = self.time, self.censored
+        return bool(np.all((time[1:] > time[:-1]) | ((time[1:] == time[:-1]) & (censored[1:] >= censored[:-1]))))
+
+    def sorted(self):
+        """
+        Returns the batch in sort_order(), which is the batch itself when it is already sorted.
+        :return: a DatumBatch
+        """
+        return self if self.is_sorted() else self.take(self.sort_order())
+
+    def take(self, rows):
+        """
+        Returns the batch restricted to some rows, sharing the metadata table.
+        :param rows: index array, boolean mask or slice
+        :return: a DatumBatch
+        """
+        return DatumBatch(self.time[rows], self.censored[rows], self.row[rows], self.meta)
+
+    def materialize(self, lo=0, hi=None):
+        """
+        Builds Datum objects for rows [lo, hi).
+        :param lo: first row
+        :param hi: row after the last, defaults to the end of the batch
+        :return: list of Datum objects
+        """
+        stage = instrument.stage('DatumBatch.materialize')
+        times = self.time[lo:hi].tolist()
+        censored = self.censored[lo:hi].tolist()
+        if self.meta is None:
+            data = [Datum(t, c) for t, c in zip(times, censored)]
+        else:
+            meta = self.meta
+            data = [Datum(t, c, meta[r]) for t, c, r in zip(times, censored, self.row[lo:hi].tolist())]
+        stage.done(count=len(data))
+        return data
+
+
+CONFIDENCE_Z = 1.959963984540054  # Two sided 95% confidence intervals
+
+
+def _log_log(survival, greenwood, z):
+    """
+    Log-log confidence interval of survival, S ** exp(+-z * se(log(-log S))), which stays within [0, 1].
+    :return: (lower, upper) arrays
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = np.exp(z * np.sqrt(greenwood) / np.abs(np.log(survival)))
+        inside = (survival > 0) & (survival < 1)
+        return np.where(inside, survival ** spread, survival), np.where(inside, survival ** (1 / spread), survival)
+
+
+def _curve_statistics(end, died, censored, z=CONFIDENCE_Z):
+    """
+    Cumulative survival of each interval, following the rules of Analyzer.compute(), with its Greenwood variance and
+    log-log confidence interval, the survival after the deaths of each interval, and the median survival time.
+    :param end: array of interval ends
+    :param died: array of deaths per interval
+    :param censored: array of censored donors per interval
+    :param z: normal quantile of the confidence intervals
+    :return: (cumulative, survival after, variance, lower, upper, median)
+    """
+    removed = died + censored
+    at_risk = removed.sum() - (np.cumsum(removed) - removed) - censored
+    with np.errstate(divide='ignore', invalid='ignore'):
+        multiplier = np.where(at_risk > 0, (at_risk - died) / at_risk, 1)
+        greenwood = np.cumsum(np.where(at_risk > died, died / (at_risk * (at_risk - died)), 0))
+    survival = np.cumprod(multiplier)
+    cumulative = np.concatenate(([1], survival))[:-1]
+    cumulative_greenwood = np.concatenate(([0], greenwood))[:-1]
+
+    variance = cumulative ** 2 * cumulative_greenwood
+    lower, upper = _log_log(cumulative, cumulative_greenwood, z)
+    survival_lower, survival_upper = _log_log(survival, greenwood, z)
+    median = _median(end, survival, survival_lower, survival_upper)
+    return cumulative, survival, variance, lower, upper, median
+
+
+def _median(end, survival, lower, upper):
+    """
+    Median survival time, the first time the survival drops to one half, and its confidence interval from the
+    times the confidence bounds do.
+    :param end: array of interval ends
+    :param survival: array of survival after each interval
+    :param lower: array of lower confidence bounds after each interval
+    :param upper: array of upper confidence bounds after each interval
+    :return: dictionary of 'median', 'lower' and 'upper', None for times the curve never reaches
+    """
+    def first(values):
+        below = np.flatnonzero(values <= 0.5)
+        return end[below[0]].item() if len(below) else None
+
+    return {'median': first(survival), 'lower': first(lower), 'upper': first(upper)}
+
+
+class IntervalTable(object):
+    """
+    Columnar form of the Kaplan-Meier intervals. Interval k covers rows offsets[k]..offsets[k+1] of the sorted batch.
+    Tables computed from aggregated counts have no batch, and their intervals no data.
+
+    Cumulative survival, its variance and confidence interval, and the median survival time are computed with the
+    table. survival holds the survival after the deaths of each interval, which survival_at() looks up by bisection.
+    """
+    __slots__ = ('start', 'end', 'died', 'censored', 'offsets', 'batch', 'cumulative', 'survival', 'variance', 'lower',
+                 'upper', 'median')
+
+    def __init__(self, start, end, died, censored, offsets, batch):
+        """
+        Constructor
+        :param start: array of interval starts
+        :param end: array of interval ends
+        :param died: array of deaths per interval
+        :param censored: array of censored donors per interval
+        :param offsets: array of len(end) + 1 row offsets into batch
+        :param batch: the DatumBatch, sorted by time, or None
+        """
+        self.start = start
+        self.end = end
+        self.died = died
+        self.censored = censored
+        self.offsets = offsets
+        self.batch = batch
+        self.cumulative, self.survival, self.variance, self.lower, self.upper, self.median = \
+            _curve_statistics(end, died, censored)
+
+    def __len__(self):
+        return len(self.end)
+
+    def survival_at(self, time):
+        """
+        Survival at a time, in O(log n).
+        :param time: time
+        :return: float
+        """
+        k = np.searchsorted(self.end, time, side='right')
+        return 1 if k == 0 else self.survival[k - 1].item()
+
+    def simplify(self, epsilon=0, max_points=None):
+        """
+        Merges runs of adjacent intervals into one, so the step function plotted from the cumulative survival stays
+        within epsilon of the exact one. A merged interval has the counts and donors of its run, and the cumulative
+        survival, variance and confidence interval of its first interval. Runs are chosen greedily, which gives the
+        fewest intervals for epsilon since cumulative survival never increases.
+        :param epsilon: maximum difference between the simplified and the exact cumulative survival
+        :param max_points: maximum number of intervals, epsilon is raised to the smallest value meeting it
+        :return: An IntervalTable
+        """
+        if max_points is not None and max_points < 1:
+            raise ValueError('max_points must be at least 1')
+        if not len(self):
+            return self
+        negated = (-self.cumulative).tolist()
+        starts = _run_starts(negated, epsilon, max_points)
+        if starts is None:
+            low, high = epsilon, 1  # Survival is within [0, 1], so a single run is within 1 of its first
+            for _ in range(50):
+                middle = (low + high) / 2
+                if _run_starts(negated, middle, max_points) is None:
+                    low = middle
+                else:
+                    high = middle
+            starts = _run_starts(negated, high, max_points)
+
+        firsts = np.array(starts, dtype=np.intp)
+        lasts = np.append(firsts[1:], len(self)) - 1
+        table = IntervalTable.__new__(IntervalTable)
+        table.start = self.start[firsts]
+        table.end = self.end[lasts]
+        table.died = np.add.reduceat(self.died, firsts)
+        table.censored = np.add.reduceat(self.censored, firsts)
+        table.offsets = self.offsets[np.append(firsts, len(self))]
+        table.batch = self.batch
+        table.cumulative = self.cumulative[firsts]
+        table.survival = self.survival[lasts]
+        table.variance = self.variance[firsts]
+        table.lower = self.lower[firsts]
+        table.upper = self.upper[firsts]
+        table.median = self.median
+        return table
+
+    def to_intervals(self, donor_sample=None):
+        """
+        Converts the table to Interval objects. Their data is built from the batch on first access.
+        :param donor_sample: maximum number of donors per interval. Larger intervals get that many donors evenly
+            spaced in time order, built right away; their died and censored counts still cover all their donors.
+        :return: A list of intervals
+        """
+        stage = instrument.stage('IntervalTable.to_intervals')
+        intervals = []
+        offsets = self.offsets.tolist()
+        cumulatives = self.cumulative.tolist()
+        if cumulatives:
+            cumulatives[0] = 1  # As in compute(), which starts from the integer 1
+        for k, (start, end, died, censored, cumulative, variance, lower, upper) in enumerate(zip(
+                self.start.tolist(), self.end.tolist(), self.died.tolist(), self.censored.tolist(), cumulatives,
+                self.variance.tolist(), self.lower.tolist(), self.upper.tolist())):
+            interval = Interval(start, end)
+            interval.died = died
+            interval.cumulative = cumulative
+            interval.variance = variance
+            interval.lower = lower
+            interval.upper = upper
+            interval._censored = censored
+            if self.batch is not None:
+                lo, hi = offsets[k], offsets[k + 1]
+                if donor_sample is not None and hi - lo > donor_sample:
+                    rows = np.linspace(lo, hi - 1, donor_sample).round().astype(np.intp)
+                    interval._data = self.batch.take(rows).materialize()
+                else:
+                    interval._data = None
+                    interval._source = (self.batch, lo, hi)
+            intervals.append(interval)
+        stage.done(count=len(intervals))
+        return intervals
+
+
+def _run_starts(negated, epsilon, limit=None):
+    """
+    First interval of each run of IntervalTable.simplify(), greedily extending runs while the cumulative survival
+    stays within epsilon of the run's first.
+    :param negated: list of negated cumulative survival, which is non decreasing
+    :param epsilon: maximum difference within a run
+    :param limit: maximum number of runs
+    :return: list of indices, or None if there would be more than limit runs
+    """
+    starts = []
+    k = 0
+    while k < len(negated):
+        if limit is not None and len(starts) == limit:
+            return None
+        starts.append(k)
+        k = bisect_right(negated, negated[k] + epsilon, k + 1)
+    return starts
+
+
+_get_time = attrgetter('time')
+_get_censored = attrgetter('censored')
+
+
+def _sort(data):
+    """
+    Sorts Datum objects by time, deaths before censorings at the same time. Two stable sorts on attrgetter keys are
+    faster than one sort on a tuple key.
+    :param data: iterable of Datum objects
+    :return: sorted list
+    """
+    return sorted(sorted(data, key=_get_censored), key=_get_time)
+
+
+def _is_sorted(data):
+    """
+    Whether Datum objects are ordered as by _sort, checked in linear time.
+    :param data: list of Datum objects
+    :return: boolean
+    """
+    return all(a.time < b.time or (a.time == b.time and a.censored <= b.censored)
+               for a, b in zip(data, islice(data, 1, None)))
+
+
+class Analyzer(object):
     """
     Analyzer class responsible for consuming the data and outputting the intervals for a
     Kaplan-Meier survival plot.
     """
 
-    def __init__(self, data):
+    def __init__(self, data, assume_sorted=None):
         """
-        Constructor that takes a list of Datum object
-        :param data: list of Datum objects
+        Constructor that takes a list of Datum object, or a DatumBatch. Donors are ordered by time, deaths before
+        censorings at the same time, otherwise keeping their input order, so the same donors always give the same
+        intervals and donor lists.
+        :param data: list of Datum objects, or a DatumBatch
+        :param assume_sorted: True to use data as is, which must then already be in that order. None checks the order
+            in linear time and only sorts if needed. False always sorts.
         """
-        self.data = sorted(list(data), key=lambda d: d.time)
         self.intervals = None
+        self.median = None
+        self._ends = self._survival = None
+        stage = instrument.stage('Analyzer.sort')
+        if isinstance(data, DatumBatch):
+            self.data = None
+            if assume_sorted:
+                self.batch = data
+            elif assume_sorted is None:
+                self.batch = data.sorted()
+            else:
+                self.batch = data.take(data.sort_order())
+        else:
+            if not isinstance(data, list):
+                data = list(data)
+            if not assume_sorted and (assume_sorted is not None or not _is_sorted(data)):
+                data = _sort(data)
+            self.data = data
+            self.batch = None
+        stage.done(count=len(data))
 
-    def compute(self):
+    @classmethod
+    def from_arrays(cls, times, events, ids=None, assume_sorted=None):
+        """
+        Alternate constructor taking parallel columns instead of Datum objects. Computing from columns is vectorized
+        and only creates Datum objects if an interval's data is accessed.
+        :param times: sequence of times
+        :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+        :param ids: optional sequence of donor ids, exposed as {'id': ...} metadata on the Datum objects
+        :param assume_sorted: as for the constructor
+        :return: an Analyzer
         """
-        Computes the intervals used to generate the Kaplan-Meier plot. This will mutate the passed data by sorting it
-        which is required for the analysis.
+        meta = None if ids is None else _IdMeta(np.asarray(ids, dtype=object))
+        return cls(DatumBatch(times, ~np.asarray(events, dtype=bool), meta=meta), assume_sorted)
+
+    def compute(self, max_points=None, donor_sample=None, epsilon=None):
+        """
+        Computes the intervals used to generate the Kaplan-Meier plot. The data passed to the constructor is not
+        modified; unsorted data was sorted into a copy.
+
+        For plotting large cohorts, the intervals can be reduced with IntervalTable.simplify() and the donors of each
+        interval sampled. Reduced intervals are computed from columns, so their donors are new Datum objects.
+        :param max_points: maximum number of intervals
+        :param donor_sample: maximum number of donors per interval, see IntervalTable.to_intervals()
+        :param epsilon: maximum difference between the reduced and the exact cumulative survival
         :return: A list of intervals
         """
+        if self.batch is not None or max_points is not None or donor_sample is not None or epsilon is not None:
+            return self._table_intervals(max_points, donor_sample, epsilon)
 
+        stage = instrument.stage('Analyzer.compute')
         time = []  # Times of incidents
         censored = []  # Type of incident (censured/dead)
         for datum in self.data:
@@ -155,5 +651,406 @@ class Analyzer:
                 current_interval.increment_died()
 
         current_interval.cumulative = cumulative_survival
+
+        ends = np.array([interval.end for interval in intervals])
+        _, self._survival, variance, lower, upper, self.median = _curve_statistics(
+            ends, np.array([interval.died for interval in intervals]),
+            np.array([interval.get_censored() for interval in intervals]))
+        self._ends = ends
+        for interval, v, lo, up in zip(intervals, variance.tolist(), lower.tolist(), upper.tolist()):
+            interval.variance = v
+            interval.lower = lo
+            interval.upper = up
+
+        stage.done(count=len(intervals))
         self.intervals = intervals
         return self.intervals
+
+    def survival_at(self, time):
+        """
+        Survival at a time, in O(log n) once the intervals are computed.
+        :param time: time
+        :return: float
+        """
+        if self._survival is None:
+            self.compute()
+        k = np.searchsorted(self._ends, time, side='right')
+        return 1 if k == 0 else self._survival[k - 1].item()
+
+    def _table_intervals(self, max_points=None, donor_sample=None, epsilon=None):
+        """
+        compute() from compute_table(), see compute() for the parameters.
+        :return: A list of intervals
+        """
+        table = self.compute_table()
+        self._ends, self._survival, self.median = table.end, table.survival, table.median
+        if max_points is not None or epsilon is not None:
+            table = table.simplify(epsilon or 0, max_points)
+        self.intervals = table.to_intervals(donor_sample)
+        return self.intervals
+
+    def compute_table(self):
+        """
+        Vectorized equivalent of compute() for an Analyzer built from a DatumBatch. Censored donors are removed from
+        the risk set before the deaths of their interval, exactly as in compute().
+        :return: An IntervalTable
+        """
+        batch = self.batch
+        if batch is None:
+            batch = DatumBatch.from_data(self.data)
+        return _interval_table(batch)
+
+    @staticmethod
+    def compute_many(times, events, groups, ids=None):
+        """
+        Computes one curve per group of a shared donor universe. The universe is sorted once and every group's curve
+        is cut from that ordering, so each curve only costs linear work.
+        :param times: sequence of times
+        :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+        :param groups: either a groups x donors boolean mask, or one label per donor
+        :param ids: optional sequence of donor ids, exposed as {'id': ...} metadata on the Datum objects
+        :return: A list of IntervalTables, one per mask row or per distinct label in sorted order
+        """
+        batch, index, offsets = _group_segments(times, events, groups, ids)
+        return [_interval_table(batch.take(index[lo:hi])) for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+
+class StreamingAnalyzer(object):
+    """
+    Builds a Kaplan-Meier curve from chunks of (time, event) columns, e.g. read from a CSV file or a database cursor.
+    Only the number of deaths and censorings per distinct time is kept, so memory is bounded by the number of
+    distinct times rather than the number of donors. The intervals computed have the same counts and cumulative
+    survival as Analyzer.compute(), but no donor data.
+    """
+
+    def __init__(self):
+        """
+        Constructor for an empty curve
+        """
+        self.times = np.zeros(0)
+        self.died = np.zeros(0, dtype=np.int64)
+        self.censored = np.zeros(0, dtype=np.int64)
+        self.intervals = None
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Consumes an iterable of chunks.
+        :param chunks: iterable of (times, events) pairs of sequences, events being True where the donor died
+        :return: a StreamingAnalyzer
+        """
+        analyzer = cls()
+        for times, events in chunks:
+            analyzer.add(times, events)
+        return analyzer
+
+    @classmethod
+    def from_rows(cls, rows, chunk_size=100000):
+        """
+        Consumes an iterable of rows, chunk_size rows at a time.
+        :param rows: iterable of (time, event) pairs, event being True where the donor died
+        :param chunk_size: number of rows held in memory at once
+        :return: a StreamingAnalyzer
+        """
+        analyzer = cls()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return analyzer
+            times, events = zip(*chunk)
+            analyzer.add(times, events)
+
+    def add(self, times, events):
+        """
+        Adds a chunk of donors to the counts.
+        :param times: sequence of times
+        :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+        """
+        events = np.asarray(events, dtype=bool)
+        times = np.asarray(times)
+        if len(self.times):
+            times = np.concatenate((self.times, times))
+        distinct, index = np.unique(times, return_inverse=True)
+        index = index.ravel()
+        known = len(self.times)
+
+        died = np.bincount(index[known:][events], minlength=len(distinct))
+        censored = np.bincount(index[known:][~events], minlength=len(distinct))
+        died[index[:known]] += self.died
+        censored[index[:known]] += self.censored
+
+        self.times, self.died, self.censored = distinct, died, censored
+        self.intervals = None
+
+    def __len__(self):
+        return int(self.died.sum() + self.censored.sum())
+
+    def counts(self):
+        """
+        Deaths and censorings per distinct time, e.g. as input to LogRankTest.
+        :return: (sorted distinct times, died, censored) arrays
+        """
+        return self.times, self.died, self.censored
+
+    def compute_table(self):
+        """
+        Computes the intervals from the counts so far.
+        :return: An IntervalTable, without batch
+        """
+        return _count_table(self.times, self.died, self.censored)
+
+    def compute(self):
+        """
+        Computes the intervals from the counts so far.
+        :return: A list of intervals, without donor data
+        """
+        self.intervals = self.compute_table().to_intervals()
+        return self.intervals
+
+
+def _donor_id(datum):
+    return datum.meta['id']
+
+
+class IncrementalAnalyzer(object):
+    """
+    Kaplan-Meier curve kept up to date as donors are added, removed or updated. Deaths and censorings are counted per
+    distinct time in sorted arrays, so a change never re-sorts the donors and the curve is computed from the distinct
+    times only. Intervals have no donor data, as with StreamingAnalyzer.
+
+    A change at a time already counted finds it by bisection and is O(log n). Changes at new times are buffered and
+    merged into the arrays once the buffer reaches a fraction of their length, so their amortized cost is O(log n)
+    plus a vectorized share of the merge. compute() recomputes the curve with numpy and reuses the Interval objects of
+    the previous result, updating only the ones whose values changed.
+    """
+
+    def __init__(self, data=(), key=_donor_id):
+        """
+        Constructor
+        :param data: iterable of Datum objects to start with
+        :param key: function returning the identity of a donor, by default its 'id' metadata
+        """
+        self.key = key
+        self.intervals = None
+        self._donors = {}  # key -> (time, censored) as last added
+        self._table = None  # Table of the current counts, None after a change
+        self._intervals_table = None  # Table self.intervals were built from
+        times = []
+        for datum in data:
+            self.__register(datum)
+            times.append(datum.time)
+        censored = np.array([bool(c) for _, c in self._donors.values()], dtype=bool)
+        self._times, index = np.unique(np.array(times), return_inverse=True)  # Sorted distinct times
+        index = index.ravel()
+        self._died = np.bincount(index[~censored], minlength=len(self._times)).astype(np.int64)
+        self._censored = np.bincount(index[censored], minlength=len(self._times)).astype(np.int64)
+        self._pending = {}  # time -> [died, censored] of times not in the arrays yet
+
+    def __len__(self):
+        return len(self._donors)
+
+    def __contains__(self, datum):
+        return self.key(datum) in self._donors
+
+    def __register(self, datum):
+        key = self.key(datum)
+        if key in self._donors:
+            raise ValueError('Donor already added: {}'.format(key))
+        self._donors[key] = (datum.time, datum.censored)
+
+    def add(self, datum):
+        """
+        Adds a donor.
+        :param datum: Datum object, whose key must not have been added yet
+        """
+        self.__register(datum)
+        self.__count(datum.time, datum.censored, 1)
+
+    def remove(self, datum):
+        """
+        Removes a donor, as it was last added or updated.
+        :param datum: Datum object, or any object with the same key
+        """
+        key = self.key(datum)
+        if key not in self._donors:
+            raise KeyError(key)
+        time, censored = self._donors.pop(key)
+        self.__count(time, censored, -1)
+
+    def update(self, datum):
+        """
+        Replaces the time and censored status of a donor with the ones of datum.
+        :param datum: Datum object, whose key must have been added
+        """
+        self.remove(datum)
+        self.add(datum)
+
+    def __count(self, time, censored, change):
+        k = np.searchsorted(self._times, time)
+        if k < len(self._times) and self._times[k] == time:
+            (self._censored if censored else self._died)[k] += change
+        else:
+            counts = self._pending.setdefault(time, [0, 0])
+            counts[1 if censored else 0] += change
+            if len(self._pending) > max(256, len(self._times) >> 5):
+                self.__merge()
+        self._table = None
+
+    def __merge(self):
+        """
+        Merges the buffered times into the arrays and drops times without donors.
+        """
+        times, died, censored = self._times, self._died, self._censored
+        if self._pending:
+            pending = np.array(list(self._pending.values()), dtype=np.int64)
+            times = np.concatenate((times, list(self._pending)))
+            died = np.concatenate((died, pending[:, 0]))
+            censored = np.concatenate((censored, pending[:, 1]))
+            order = np.argsort(times, kind='mergesort')
+            times, died, censored = times[order], died[order], censored[order]
+            self._pending = {}
+        keep = (died != 0) | (censored != 0)
+        self._times, self._died, self._censored = times[keep], died[keep], censored[keep]
+
+    def counts(self):
+        """
+        Deaths and censorings per distinct time, e.g. as input to LogRankTest.
+        :return: (sorted distinct times, died, censored) arrays
+        """
+        self.__merge()
+        return self._times, self._died.copy(), self._censored.copy()
+
+    def compute_table(self):
+        """
+        Computes the intervals of the current donors, kept until the next change.
+        :return: An IntervalTable, without batch
+        """
+        if self._table is None:
+            self._table = _count_table(*self.counts())
+        return self._table
+
+    def compute(self):
+        """
+        Computes the intervals of the current donors. Interval objects of the previous result are reused, so they
+        are updated in place by the first compute() after a change.
+        :return: A list of intervals, without donor data
+        """
+        table = self.compute_table()
+        if self._intervals_table is not table:
+            if self.intervals is None or not len(self._intervals_table) or not len(table):
+                self.intervals = table.to_intervals()
+            else:
+                self.intervals = _patch_intervals(self.intervals, self._intervals_table, table)
+            self._intervals_table = table
+        return self.intervals
+
+
+def _patch_intervals(intervals, old, new):
+    """
+    Intervals of a new table, reusing the Interval objects of an old table with the same end and updating only the
+    values that changed.
+    :param intervals: list of the Interval objects of old
+    :param old: IntervalTable intervals were built from
+    :param new: IntervalTable
+    :return: A list of intervals
+    """
+    position = np.minimum(np.searchsorted(old.end, new.end), len(old) - 1)
+    found = old.end[position] == new.end
+    changed = ~found
+    for name in ('start', 'died', 'censored', 'cumulative', 'variance', 'lower', 'upper'):
+        changed |= getattr(old, name)[position] != getattr(new, name)
+
+    reused = np.empty(len(intervals), dtype=object)
+    reused[:] = intervals
+    patched = reused[position]
+    for k in np.flatnonzero(~found).tolist():
+        patched[k] = Interval(0, 0)
+
+    rows = np.flatnonzero(changed)
+    cumulatives = new.cumulative[rows].tolist()
+    if len(rows) and rows[0] == 0:
+        cumulatives[0] = 1  # As in Analyzer.compute(), which starts from the integer 1
+    for interval, start, end, died, censored, cumulative, variance, lower, upper in zip(
+            patched[rows].tolist(), new.start[rows].tolist(), new.end[rows].tolist(), new.died[rows].tolist(),
+            new.censored[rows].tolist(), cumulatives, new.variance[rows].tolist(), new.lower[rows].tolist(),
+            new.upper[rows].tolist()):
+        interval.start = start
+        interval.end = end
+        interval.died = died
+        interval._censored = censored
+        interval.cumulative = cumulative
+        interval.variance = variance
+        interval.lower = lower
+        interval.upper = upper
+    return patched.tolist()
+
+
+def _group_segments(times, events, groups, ids=None):
+    """
+    Sorts a donor universe once and lists the rows of every group in that order.
+    :param times: sequence of times
+    :param events: sequence of booleans, True where the donor died (i.e. was not censored)
+    :param groups: either a groups x donors boolean mask, or one label per donor
+    :param ids: optional sequence of donor ids
+    :return: (batch sorted by time, row index into it, offsets), group k being index[offsets[k]:offsets[k+1]]
+    """
+    meta = None if ids is None else _IdMeta(np.asarray(ids, dtype=object))
+    batch = DatumBatch(times, ~np.asarray(events, dtype=bool), meta=meta).sorted()
+    groups = np.asarray(groups)
+
+    if groups.ndim == 2:
+        # Row-major, so each group's rows come out contiguous and in time order
+        members, index = np.nonzero(groups.astype(bool)[:, batch.row])
+        counts = np.bincount(members, minlength=len(groups))
+    else:
+        # Stable by label over the time ordering, so each label's rows stay in time order
+        labels = groups[batch.row]
+        index = np.argsort(labels, kind='mergesort')
+        counts = np.unique(labels, return_counts=True)[1]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.intp).tolist()
+    return batch, index, offsets
+
+
+def _interval_table(batch):
+    """
+    Computes the Kaplan-Meier intervals of a DatumBatch already sorted by time.
+    :param batch: DatumBatch sorted by time
+    :return: An IntervalTable
+    """
+    return _count_table(batch.time, ~batch.censored, batch.censored, batch)
+
+
+def _count_table(times, died, censored, batch=None):
+    """
+    Computes the Kaplan-Meier intervals from sorted times and the number of deaths and censorings at each of them,
+    either one row per donor or aggregated per time.
+    :param times: sorted array of times
+    :param died: array of deaths per row
+    :param censored: array of censorings per row
+    :param batch: the DatumBatch the rows belong to, if any
+    :return: An IntervalTable
+    """
+    stage = instrument.stage('IntervalTable')
+    died_times = times[(died > 0) & (times > 0)]
+    if len(died_times):  # Already sorted, so distinct values are where the value changes
+        died_times = died_times[np.concatenate(([True], died_times[1:] != died_times[:-1]))]
+    ends = died_times
+    if len(times) and times[-1] > (ends[-1] if len(ends) else 0):
+        ends = np.append(ends, times[-1])
+    if not len(ends):
+        empty = np.zeros(0, dtype=np.intp)
+        stage.done(count=0)
+        return IntervalTable(ends, ends, empty, empty, np.zeros(1, dtype=np.intp), batch)
+
+    # Each row belongs to the first interval whose end is not before its time
+    offsets = np.concatenate(([0], np.searchsorted(times, ends, side='right'))).astype(np.intp)
+    died_sums = np.concatenate(([0], np.cumsum(died)))[offsets]
+    censored_sums = np.concatenate(([0], np.cumsum(censored)))[offsets]
+
+    starts = np.concatenate(([0], ends[:-1])).astype(ends.dtype)
+    table = IntervalTable(starts, ends, np.diff(died_sums), np.diff(censored_sums), offsets, batch)
+    stage.done(count=len(table), nbytes=instrument.nbytes(table.start, table.end, table.died, table.censored,
+                                                          table.offsets, table.cumulative, table.survival,
+                                                          table.variance, table.lower, table.upper))
+    return table
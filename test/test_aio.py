@@ -0,0 +1,105 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import division
+from __future__ import print_function
+from survivalpy import aio
+from survivalpy.logrank import LogRankTest
+from survivalpy.survival import Analyzer, Datum
+import asyncio
+import sys
+import time
+import unittest
+
+
+def cohort(prefix):
+    return [Datum(t, c, {'id': '{}{}'.format(prefix, i)})
+            for i, (t, c) in enumerate([(6, True), (1, False), (3, False), (1, True), (9, True), (4, False)])]
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'survivalpy.aio requires Python 3.7+')
+class TestService(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.patched = aio._curve, aio._logrank
+
+        def slow(function):
+            def wrapper(*args):
+                self.calls.append(function.__name__)
+                time.sleep(0.1)
+                return function(*args)
+            return wrapper
+
+        aio._curve, aio._logrank = slow(aio._curve), slow(aio._logrank)
+
+    def tearDown(self):
+        aio._curve, aio._logrank = self.patched
+
+    def test_compute_curve(self):
+        expected = [i.to_json_dict() for i in Analyzer(cohort('D')).compute()]
+        table = asyncio.run(aio.compute_curve(cohort('D')))
+
+        self.assertEqual([i.to_json_dict() for i in table.to_intervals()], expected)
+
+    def test_coalesced(self):
+        async def requests():
+            service = aio.Service()
+            return await asyncio.gather(*[service.compute_curve(cohort(prefix)) for prefix in 'ABCD'])
+
+        tables = asyncio.run(requests())
+
+        self.assertEqual(self.calls, ['_curve'])
+        for prefix, table in zip('ABCD', tables):
+            ids = [d.meta['id'] for interval in table.to_intervals() for d in interval.data]
+            self.assertTrue(all(i.startswith(prefix) for i in ids))
+            self.assertEqual(len(ids), 6)
+
+    def test_logrank(self):
+        curves = [Analyzer(cohort('A')).compute(), Analyzer([Datum(2, False), Datum(5, False)]).compute()]
+        expected = LogRankTest(curves, method='exact').compute()
+
+        async def requests():
+            return await asyncio.gather(*[aio.logrank(curves, method='exact') for _ in range(3)])
+
+        self.assertEqual(asyncio.run(requests()), [expected] * 3)
+        self.assertEqual(self.calls, ['_logrank'])
+
+    def test_methods_share_key(self):
+        curves = [Analyzer(cohort('A')).compute(), Analyzer([Datum(2, False), Datum(5, False)]).compute()]
+
+        async def requests():
+            service = aio.Service()
+            return await asyncio.gather(service.logrank(curves, 'approximate', key='k'),
+                                        service.logrank(curves, 'exact', key='k'))
+
+        approximate, exact = asyncio.run(requests())
+
+        self.assertEqual(approximate, LogRankTest(curves).compute())
+        self.assertEqual(exact, LogRankTest(curves, method='exact').compute())
+        self.assertNotEqual(approximate['chiSquared'], exact['chiSquared'])
+
+    def test_backpressure(self):
+        curves = [Analyzer(cohort('A')).compute()]
+
+        async def requests():
+            service = aio.Service(max_pending=1, max_waiting=1)
+            return await asyncio.gather(*[service.logrank(curves, key=k) for k in range(3)], return_exceptions=True)
+
+        results = asyncio.run(requests())
+
+        self.assertIsInstance(results[0], dict)
+        self.assertIsInstance(results[1], dict)
+        self.assertIsInstance(results[2], asyncio.QueueFull)
@@ -16,6 +16,9 @@
 from __future__ import print_function
 from survivalpy.survival import Analyzer
 from survivalpy.survival import Datum
+from survivalpy.survival import DatumBatch
+from survivalpy.survival import IncrementalAnalyzer
+from survivalpy.survival import StreamingAnalyzer
 from survivalpy.logrank import LogRankTest
 import unittest
 import json
@@ -52,3 +55,32 @@ class TestAll(unittest.TestCase):
         self.assertEqual(stats['degreesFreedom'], 1)
         self.assertEqual(stats['pValue'], 1)
         self.assertAlmostEqual(stats['chiSquared'], 0, 2)
+
+        exact = LogRankTest([results1, results2], method='exact').compute()
+        self.assertAlmostEqual(exact['pValue'], 1)
+        self.assertAlmostEqual(exact['chiSquared'], 0)
+
+    def test_columnar_matches_objects(self):
+        data1 = [Datum(6, False), Datum(6, True), Datum(7, False), Datum(10, False), Datum(9, True),
+                 Datum(13, False), Datum(16, False), Datum(20, True), Datum(22, False), Datum(25, True)]
+        data2 = [Datum(1, False), Datum(1, False), Datum(2, False), Datum(3, False), Datum(4, True),
+                 Datum(5, False), Datum(8, False), Datum(8, False), Datum(11, True), Datum(12, False)]
+
+        expected = LogRankTest([Analyzer(data1).compute(), Analyzer(data2).compute()]).compute()
+        tables = [Analyzer(DatumBatch.from_data(data1)).compute_table(),
+                  Analyzer(DatumBatch.from_data(data2)).compute_table()]
+        stats = LogRankTest(tables).compute()
+
+        self.assertEqual(expected, stats)
+
+    def test_counts_match_objects(self):
+        data1 = [Datum(6, False, {'id': 1}), Datum(6, True, {'id': 2}), Datum(7, False, {'id': 3}),
+                 Datum(10, False, {'id': 4}), Datum(9, True, {'id': 5}), Datum(13, False, {'id': 6})]
+        data2 = [Datum(1, False, {'id': 7}), Datum(1, False, {'id': 8}), Datum(2, False, {'id': 9}),
+                 Datum(6, True, {'id': 10}), Datum(8, False, {'id': 11})]
+
+        expected = LogRankTest([Analyzer(data1).compute(), Analyzer(data2).compute()], method='exact').compute()
+        streaming = StreamingAnalyzer.from_rows((d.time, not d.censored) for d in data2)
+        stats = LogRankTest([IncrementalAnalyzer(data1), streaming], method='exact').compute()
+
+        self.assertEqual(expected, stats)
@@ -0,0 +1,57 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import division
+from __future__ import print_function
+from benchmarks.cohorts import synthetic_cohort
+from benchmarks.suite import compare, run
+import unittest
+import numpy as np
+
+
+class TestCohorts(unittest.TestCase):
+
+    def test_parameters(self):
+        times, events, labels = synthetic_cohort(10000, tie_rate=0.5, censored=0.2, groups=1, seed=1)
+
+        self.assertEqual(len(times), 10000)
+        self.assertLessEqual(len(np.unique(times)), 5000)
+        self.assertAlmostEqual(1 - events.mean(), 0.2, 1)
+        self.assertEqual(labels.tolist(), [0] * 10000)
+
+        again = synthetic_cohort(10000, tie_rate=0.5, censored=0.2, groups=1, seed=1)
+        self.assertEqual(times.tolist(), again[0].tolist())
+
+
+class TestSuite(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        baseline = run(sizes=[200], groups=[1, 3], repeat=1)
+        stages = set(r['stage'] for r in baseline['results'])
+
+        self.assertIn('Analyzer.compute[Datum]', stages)
+        self.assertIn('LogRankTest.compute[exact]', stages)
+        self.assertEqual(compare(baseline, baseline), [])
+
+        slower = {'results': [dict(r, seconds=r['seconds'] * 2 + 1) for r in baseline['results']]}
+        regressions = compare(baseline, slower, threshold=0.5)
+
+        self.assertEqual(len(regressions), len(baseline['results']))
+        self.assertTrue(all(r['metric'] == 'seconds' and r['ratio'] > 1.5 for r in regressions))
+
+    def test_object_stages_capped(self):
+        stages = [r['stage'] for r in run(sizes=[200], groups=[1], repeat=1, max_object_donors=100)['results']]
+
+        self.assertEqual(stages, ['Analyzer.compute_table', 'Analyzer.compute_many'])
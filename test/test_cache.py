@@ -0,0 +1,118 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from survivalpy.survival import Analyzer
+from survivalpy.survival import Datum
+from survivalpy.survival import DatumBatch
+from survivalpy.logrank import LogRankTest
+from survivalpy.cache import CachedAnalyzer, DiskCache, MemoryCache, cached_logrank
+import unittest
+import shutil
+import tempfile
+import numpy as np
+
+DATA = [Datum(7, True, {'id': 55}),
+        Datum(9, False, {'id': 11}),
+        Datum(2, True, {'id': 54}),
+        Datum(3, True, {'id': 19}),
+        Datum(1, False, {'id': 4}),
+        Datum(11, False, {'id': 21})]
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = MemoryCache(max_bytes=3 * 80)
+        for key in 'abc':
+            cache.put(key, np.zeros(10))
+        cache.get('a')
+        cache.put('d', np.zeros(10))
+
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 1, 1))
+
+    def test_too_large(self):
+        cache = MemoryCache(max_bytes=8)
+        cache.put('a', np.zeros(10))
+
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+
+class TestCachedAnalyzer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertCached(self, cache):
+        expected = [i.to_json_dict() for i in Analyzer(DATA).compute()]
+
+        self.assertEqual([i.to_json_dict() for i in CachedAnalyzer(DATA, cache).compute()], expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # Same columns, other donors: the curve is cached but the donors are the new ones
+        other = DatumBatch([d.time for d in DATA], [d.censored for d in DATA], meta=[{'id': i} for i in range(6)])
+        results = CachedAnalyzer(other, cache).compute()
+
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual([i.cumulative for i in results], [i['cumulativeSurvival'] for i in expected])
+        self.assertEqual(results[0].data[0].meta, {'id': 4})
+
+    def test_memory(self):
+        self.assertCached(MemoryCache())
+
+    def test_disk(self):
+        self.assertCached(DiskCache(self.directory))
+        self.assertEqual(len(DiskCache(self.directory)), 1)
+
+    def test_statistics(self):
+        cache = MemoryCache()
+        expected = Analyzer(DATA)
+        expected.compute()
+        for _ in range(2):  # A miss, then a hit
+            analyzer = CachedAnalyzer(DATA, cache)
+            analyzer.compute()
+
+            self.assertEqual(analyzer.median, expected.median)
+            self.assertEqual(analyzer.survival_at(8), expected.survival_at(8))
+
+    def test_reduced(self):
+        expected = [i.to_json_dict() for i in Analyzer(DATA).compute(max_points=2, donor_sample=1)]
+        cache = MemoryCache()
+        CachedAnalyzer(DATA, cache).compute()
+        results = CachedAnalyzer(DATA, cache).compute(max_points=2, donor_sample=1)
+
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual([i.to_json_dict() for i in results], expected)
+
+    def test_disk_eviction(self):
+        cache = DiskCache(self.directory, max_bytes=1)
+        CachedAnalyzer(DATA, cache).compute()
+
+        self.assertEqual((len(cache), cache.evictions), (0, 1))
+
+    def test_logrank(self):
+        cache = MemoryCache()
+        curves = [Analyzer(DATA).compute(), Analyzer(DATA[1:]).compute()]
+        expected = LogRankTest(curves, method='exact').compute()
+
+        self.assertEqual(cached_logrank(curves, cache, method='exact'), expected)
+        self.assertEqual(cached_logrank(curves, cache, method='exact'), expected)
+        cached_logrank(curves, cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
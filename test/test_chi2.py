@@ -0,0 +1,82 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import print_function
+from survivalpy import chi2
+import unittest
+import json
+import subprocess
+import sys
+
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
+
+
+class TestChi2(unittest.TestCase):
+
+    def test_builtin_sf(self):
+        self.assertEqual(chi2.builtin_sf(0, 1), 1)
+        self.assertAlmostEqual(chi2.builtin_sf(3.841458820694124, 1), 0.05, 12)
+        self.assertAlmostEqual(chi2.builtin_sf(5.991464547107979, 2), 0.05, 12)
+
+    @unittest.skipIf(stats is None, 'scipy is not installed')
+    def test_matches_scipy(self):
+        for df in (1, 2, 3, 7, 20, 51):
+            for x in (0.01, 0.5, 1, 4, 15.23, 30, 100, 400, 1500):
+                expected = stats.chi2.sf(x, df)
+                self.assertLess(abs(chi2.builtin_sf(x, df) - expected), 1e-11 * expected + 1e-300, (x, df))
+
+    @unittest.skipIf(stats is None, 'scipy is not installed')
+    def test_use_scipy(self):
+        self.assertEqual(chi2.sf(4, 3), chi2.builtin_sf(4, 3))
+        chi2.use_scipy = True
+        try:
+            self.assertEqual(chi2.sf(4, 3), stats.chi2.sf(4, 3))
+        finally:
+            chi2.use_scipy = False
+
+
+COMPUTE = 'import survivalpy.logrank; ' \
+          'survivalpy.logrank.LogRankTest.from_labels([1, 2, 3, 4, 5, 6], [1, 1, 0, 1, 1, 0], [0, 1, 0, 1, 0, 1]).compute()'
+
+
+def import_time(statement):
+    """
+    Best wall time of a statement in a fresh interpreter
+    :param statement: python statement, e.g. imports
+    :return: seconds
+    """
+    code = 'import timeit; print(timeit.timeit({!r}, number=1))'.format(statement)
+    return min(float(subprocess.check_output([sys.executable, '-c', code])) for _ in range(3))
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    Benchmark: importing the log-rank test and computing a first p-value do not import scipy.
+    """
+
+    def test_scipy_not_imported(self):
+        code = 'import sys; {}; print("scipy" in sys.modules)'.format(COMPUTE)
+        self.assertEqual(subprocess.check_output([sys.executable, '-c', code]).strip(), b'False')
+
+    @unittest.skipIf(stats is None, 'scipy is not installed')
+    def test_import_time(self):
+        logrank = import_time(COMPUTE)
+        scipy_stats = import_time('import numpy, scipy.stats')
+        print(json.dumps({'survivalpy.logrank + compute': logrank, 'numpy + scipy.stats': scipy_stats}))
+
+        self.assertLess(logrank, scipy_stats)
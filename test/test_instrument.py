@@ -0,0 +1,62 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import division
+from __future__ import print_function
+from survivalpy import instrument
+from survivalpy.instrument import Recorder
+from survivalpy.logrank import LogRankTest
+from survivalpy.survival import Analyzer, Datum, iter_json
+import unittest
+
+
+class TestRecorder(unittest.TestCase):
+
+    data = [Datum(1, False), Datum(1, True), Datum(3, False), Datum(4, False), Datum(6, True), Datum(9, True)]
+
+    def test_stages(self):
+        events = []
+        with Recorder(callback=events.append) as recorder:
+            results = Analyzer(self.data).compute()
+            ''.join(iter_json(results))
+            table = Analyzer.from_arrays([2, 1, 5], [True, True, False]).compute_table()
+            LogRankTest([results, table], method='exact').compute()
+
+        self.assertEqual(events, recorder.events)
+        totals = recorder.totals()
+        self.assertEqual(list(totals), ['Analyzer.sort', 'Analyzer.compute', 'iter_json', 'IntervalTable',
+                                        'LogRankTest.counts', 'LogRankTest.compute'])
+        self.assertEqual(totals['Analyzer.sort']['calls'], 2)
+        self.assertEqual(totals['Analyzer.compute']['count'], 4)
+        self.assertEqual(totals['iter_json']['count'], 4)
+        self.assertGreater(totals['IntervalTable']['bytes'], 0)
+        self.assertTrue(all(event['seconds'] >= 0 for event in events))
+
+    def test_disabled(self):
+        with Recorder() as recorder:
+            pass
+        Analyzer(self.data).compute()
+
+        self.assertEqual(recorder.events, [])
+        self.assertIs(instrument.stage('Analyzer.compute'), instrument.stage('LogRankTest.compute'))
+
+    def test_nested(self):
+        with Recorder() as outer:
+            with Recorder() as inner:
+                Analyzer(self.data).compute()
+            Analyzer(self.data).compute()
+
+        self.assertEqual(len(inner.events), 2)
+        self.assertEqual(len(outer.events), 4)
@@ -0,0 +1,84 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from survivalpy.survival import Analyzer
+from survivalpy.survival import Datum
+from survivalpy.logrank import LogRankTest
+from survivalpy import io
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+DATA = [Datum(7, True, {'id': 55}),
+        Datum(9, False, {'id': 11}),
+        Datum(9, False, {'id': 12}),
+        Datum(2, True, {'id': 54}),
+        Datum(3, True, {'id': 19}),
+        Datum(15, False, {'id': 19}),
+        Datum(1, True, {'id': 92}),
+        Datum(14, True, {'id': 33}),
+        Datum(1, False, {'id': 44}),
+        Datum(11, False, {'id': 21})]
+
+
+class TestCohortFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cohort.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_convert_json(self):
+        source = os.path.join(self.directory, 'cohort.json')
+        with open(source, 'w') as f:
+            json.dump([datum.to_json_dict() for datum in DATA], f)
+        io.convert_json(source, self.path)
+        batch = io.open_cohort(self.path)
+
+        self.assertIsInstance(batch.time.base, np.memmap)
+        self.assertEqual([d.to_json_dict() for d in batch.materialize()], [d.to_json_dict() for d in DATA])
+        self.assertEqual([i.to_json_dict() for i in Analyzer(batch).compute()],
+                         [i.to_json_dict() for i in Analyzer(DATA).compute()])
+
+    def test_logrank(self):
+        io.write_cohort(self.path, [d.time for d in DATA], [not d.censored for d in DATA])
+        batch = io.open_cohort(self.path)
+
+        self.assertIsNone(batch.meta)
+        self.assertEqual(LogRankTest([batch, Analyzer(DATA[:5]).compute()]).compute(),
+                         LogRankTest([Analyzer(DATA).compute(), Analyzer(DATA[:5]).compute()]).compute())
+
+    def test_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 100)
+
+        self.assertRaises(ValueError, io.open_cohort, self.path)
+        self.assertRaises(ValueError, io.write_cohort, self.path, [1, 2], [True])
+
+        io.write_cohort(self.path, [d.time for d in DATA], [not d.censored for d in DATA], [d.meta for d in DATA])
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        # Cut within the times, the events, the metadata offsets and the json documents
+        for size in [100, 145, 160, len(content) - 1]:
+            with open(self.path, 'wb') as f:
+                f.write(content[:size])
+            with self.assertRaises(ValueError) as context:
+                io.open_cohort(self.path)
+            self.assertEqual(str(context.exception), 'Truncated cohort file')
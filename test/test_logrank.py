@@ -14,10 +14,11 @@
 # IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from __future__ import print_function
-from survivalpy.survival import Interval, Datum
-from survivalpy.logrank import LogRankTest
+from survivalpy.survival import Analyzer, Interval, Datum, DatumBatch, StreamingAnalyzer
+from survivalpy.logrank import LogRankTest, WeightedLogRankTest
 import unittest
 import json
+import timeit
 
 
 def dt(t):
@@ -139,3 +140,108 @@ class TestStats(unittest.TestCase):
         self.assertEqual(stats['degreesFreedom'], 1)
         self.assertLess(stats['pValue'], 0.0001)
         self.assertAlmostEqual(stats['chiSquared'], 15.23, 2)
+
+        exact = LogRankTest(survival_results=results, method='exact').compute()
+        print(json.dumps(exact))
+
+        self.assertEqual(exact['degreesFreedom'], 1)
+        self.assertLess(exact['pValue'], 0.0001)
+        self.assertAlmostEqual(exact['chiSquared'], 16.79, 2)
+
+        weighted = WeightedLogRankTest(results).compute(weights=('logrank', 'wilcoxon', 'tarone-ware', (0, 0)))
+        print(json.dumps(weighted))
+
+        self.assertEqual(list(weighted), ['logrank', 'wilcoxon', 'tarone-ware', 'fleming-harrington(0, 0)'])
+        self.assertAlmostEqual(weighted['logrank']['chiSquared'], exact['chiSquared'])
+        self.assertAlmostEqual(weighted['fleming-harrington(0, 0)']['chiSquared'], exact['chiSquared'])
+        self.assertAlmostEqual(weighted['wilcoxon']['chiSquared'], 13.458, 3)
+        self.assertAlmostEqual(weighted['tarone-ware']['chiSquared'], 15.124, 3)
+
+        # Two copies of the same stratum double the scores and their variances
+        stratified = WeightedLogRankTest(strata=[results, results]).compute()
+        for name, stats in weighted.items():
+            if name in stratified:
+                self.assertAlmostEqual(stratified[name]['chiSquared'], 2 * stats['chiSquared'])
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, LogRankTest, [], 'fast')
+
+    def test_from_labels(self):
+        times = [6, 6, 7, 9, 10, 1, 1, 2, 3, 8, 4, 5, 5, 11]
+        events = [True, False, True, False, True, True, True, True, False, True, True, False, True, True]
+        labels = ['b', 'b', 'b', 'b', 'b', 'a', 'a', 'a', 'a', 'a', 'c', 'c', 'c', 'c']
+        sets = [DatumBatch(times[lo:hi], [not e for e in events[lo:hi]]) for lo, hi in [(5, 10), (0, 5), (10, 14)]]
+
+        for method in LogRankTest.METHODS:
+            test = LogRankTest.from_labels(times, events, labels, method=method)
+            expected = LogRankTest(sets, method=method)
+
+            self.assertEqual(test.labels.tolist(), ['a', 'b', 'c'])
+            self.assertEqual(test.set_totals, [5, 5, 4])
+            self.assertEqual(test.total_observed, expected.total_observed)
+            self.assertEqual(test.samples, expected.samples)
+            self.assertAlmostEqual(test.compute()['chiSquared'], expected.compute()['chiSquared'])
+
+    def test_sparse_counts(self):
+        # One donor per group, so one nonzero cell per time
+        test = LogRankTest.from_labels(range(300), [True] * 300, range(300), method='exact')
+
+        self.assertEqual(len(test.counts.died), 300)
+        self.assertEqual(test.died.shape, (300, 300))
+        self.assertIs(test.died, test.died)
+        self.assertIsNone(LogRankTest([[], []]).labels)
+        self.assertEqual(test.compute()['degreesFreedom'], 299)
+
+    def test_intervals_without_donors(self):
+        analyzer = StreamingAnalyzer.from_chunks([([1, 2, 3], [True, False, True])])
+
+        self.assertRaises(ValueError, LogRankTest, [analyzer.compute_table(), analyzer])
+        self.assertRaises(ValueError, LogRankTest, [analyzer.compute(), analyzer])
+        self.assertEqual(LogRankTest([analyzer, analyzer]).compute()['chiSquared'], 0)
+
+    def test_sampled_donors(self):
+        times = list(range(1, 21))
+        events = [t % 3 != 0 for t in times]
+        sampled = Analyzer.from_arrays(times, events).compute(donor_sample=1)
+        full = Analyzer.from_arrays(times[::2], events[::2]).compute(max_points=3)
+
+        self.assertRaises(ValueError, LogRankTest, [sampled, full])
+        self.assertEqual(LogRankTest([full, full]).compute()['chiSquared'], 0)
+
+    def test_weighted_errors(self):
+        self.assertRaises(ValueError, WeightedLogRankTest)
+        self.assertRaises(ValueError, WeightedLogRankTest, strata=[[[], []], [[]]])
+        self.assertRaises(ValueError, WeightedLogRankTest([[], []]).compute, ['peto'])
+
+
+def curve(num_intervals):
+    """
+    Survival curve of num_intervals intervals, each with one death and one censored donor
+    :param num_intervals: number of intervals
+    :return: list of Interval objects
+    """
+    intervals = []
+    for t in range(1, num_intervals + 1):
+        interval = Interval(t - 1, t)
+        interval.died = 1
+        interval.data = [ct(t), dt(t)]
+        intervals.append(interval)
+    return intervals
+
+
+class TestSampleMapScaling(unittest.TestCase):
+    """
+    Regression benchmark: building the sample map used to be quadratic in the number of intervals.
+    """
+
+    def time_construction(self, num_intervals):
+        curves = [curve(num_intervals), curve(num_intervals)]
+        return min(timeit.repeat(lambda: LogRankTest(curves).samples, number=1, repeat=3))
+
+    def test_near_linear(self):
+        small = self.time_construction(1000)
+        large = self.time_construction(8000)
+        print(json.dumps({'1000': small, '8000': large}))
+
+        # 8x the intervals; quadratic construction would take ~64x as long
+        self.assertLess(large / small, 24)
@@ -0,0 +1,56 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import print_function
+from survivalpy.survival import Analyzer
+from survivalpy.survival import DatumBatch
+from survivalpy.logrank import LogRankTest
+import unittest
+import numpy as np
+
+try:
+    from survivalpy import parallel
+except ImportError:  # multiprocessing.shared_memory needs Python 3.8+
+    parallel = None
+
+
+@unittest.skipIf(parallel is None, 'survivalpy.parallel requires Python 3.8+')
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(7)
+        self.times = random.randint(1, 60, 400)
+        self.events = random.rand(400) < 0.6
+        self.labels = random.randint(0, 9, 400)
+
+    def test_compute_many(self):
+        expected = Analyzer.compute_many(self.times, self.events, self.labels, ids=np.arange(400))
+        tables = parallel.compute_many(self.times, self.events, self.labels, ids=np.arange(400), workers=2)
+
+        self.assertEqual(len(tables), len(expected))
+        for e, t in zip(expected, tables):
+            self.assertEqual([i.to_json_dict() for i in e.to_intervals()], [i.to_json_dict() for i in t.to_intervals()])
+
+    def test_logrank_matrix(self):
+        curves = [DatumBatch(self.times[self.labels == k], ~self.events[self.labels == k]) for k in range(4)]
+        matrix = parallel.run_logrank_matrix(curves, workers=2, method='exact')
+
+        for i in range(4):
+            self.assertIsNone(matrix[i][i])
+            for j in range(4):
+                if i != j:
+                    expected = LogRankTest([curves[i], curves[j]], method='exact').compute()
+                    self.assertAlmostEqual(matrix[i][j]['chiSquared'], expected['chiSquared'])
+                    self.assertAlmostEqual(matrix[i][j]['pValue'], expected['pValue'])
@@ -0,0 +1,69 @@
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from survivalpy.survival import Analyzer
+from survivalpy.survival import DatumBatch
+from survivalpy.logrank import LogRankTest
+from survivalpy.resampling import bootstrap_bands, permutation_logrank
+import unittest
+import numpy as np
+
+TIMES = [7, 9, 9, 2, 3, 15, 1, 14, 1, 11, 0, 4, 4, 8]
+EVENTS = [False, True, True, False, False, True, False, False, True, True, True, True, False, True]
+
+
+class TestBootstrap(unittest.TestCase):
+
+    def test_bands(self):
+        bands = bootstrap_bands(TIMES, EVENTS, replicates=400, seed=3)
+        results = Analyzer.from_arrays(TIMES, EVENTS).compute()
+
+        self.assertEqual(bands['end'], [i.end for i in results])
+        for lower, cumulative, upper in zip(bands['lower'], bands['cumulativeSurvival'], bands['upper']):
+            self.assertLessEqual(lower, cumulative)
+            self.assertGreaterEqual(upper, cumulative)
+        self.assertEqual(bands['lower'][0], 1)
+
+    def test_reproducible(self):
+        self.assertEqual(bootstrap_bands(TIMES, EVENTS, replicates=50, seed=1, chunk_size=7),
+                         bootstrap_bands(TIMES, EVENTS, replicates=50, seed=1, chunk_size=50))
+
+
+class TestPermutation(unittest.TestCase):
+
+    def test_identical(self):
+        batch = DatumBatch(TIMES, ~np.asarray(EVENTS))
+        stats = permutation_logrank([batch, batch], permutations=200, seed=0)
+
+        self.assertAlmostEqual(stats['chiSquared'], 0)
+        self.assertEqual(stats['pValue'], 1)
+
+    def test_separated(self):
+        early = DatumBatch(range(1, 11), [False] * 10)
+        late = DatumBatch(range(21, 31), [False] * 8 + [True] * 2)
+
+        for method in ('approximate', 'exact'):
+            stats = permutation_logrank([early, late], permutations=500, method=method, seed=0)
+            expected = LogRankTest([early, late], method='exact').compute()
+
+            self.assertLess(stats['pValue'], 0.01)
+            if method == 'exact':
+                self.assertAlmostEqual(stats['chiSquared'], expected['chiSquared'])
+
+    def test_reproducible(self):
+        curves = [DatumBatch(TIMES[:7], ~np.asarray(EVENTS[:7])), DatumBatch(TIMES[7:], ~np.asarray(EVENTS[7:]))]
+
+        self.assertEqual(permutation_logrank(curves, permutations=60, seed=5, chunk_size=9),
+                         permutation_logrank(curves, permutations=60, seed=5, chunk_size=60))
@@ -14,13 +14,20 @@
 # IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from __future__ import print_function
+from __future__ import division
 from survivalpy.survival import Analyzer
 from survivalpy.survival import Datum
 from survivalpy.survival import Interval
+from survivalpy.survival import DatumBatch
+from survivalpy.survival import StreamingAnalyzer
+from survivalpy.survival import IncrementalAnalyzer
+from survivalpy.survival import iter_json
 import unittest
 import pprint
 import pickle
 import os
+import json
+import numpy as np
 
 
 class TestAnalyzer(unittest.TestCase):
@@ -60,6 +67,346 @@ class TestAnalyzer(unittest.TestCase):
 
             self.assertEqual(True, all(a >= b for a, b in zip(cum_suv[:-1], cum_suv[1:])))
 
+    def test_tie_order(self):
+        """
+        At the same time deaths come before censorings, whatever the input order.
+        """
+        data = [Datum(6, True, {'id': 'D32'}), Datum(1, True, {'id': 'D54'}), Datum(6, False, {'id': 'D20'}),
+                Datum(1, False, {'id': 'D13'}), Datum(9, True, {'id': 'D51'})]
+        expected = [i.to_json_dict() for i in Analyzer(data).compute()]
+
+        self.assertEqual([d['meta']['id'] for i in expected for d in i['donors']], ['D13', 'D54', 'D20', 'D32', 'D51'])
+        self.assertEqual([i.to_json_dict() for i in Analyzer(data[::-1]).compute()], expected)
+        self.assertEqual([i.to_json_dict() for i in Analyzer(DatumBatch.from_data(data[::-1])).compute()], expected)
+
+    def test_sorted_fast_path(self):
+        data = [Datum(1, False), Datum(1, True), Datum(3, False), Datum(4, True)]
+
+        self.assertIs(Analyzer(data).data, data)
+        self.assertIs(Analyzer(data, assume_sorted=True).data, data)
+        self.assertIsNot(Analyzer(data, assume_sorted=False).data, data)
+        self.assertIsNot(Analyzer(data[::-1]).data[0], data[-1])
+
+        batch = DatumBatch.from_data(data)
+        self.assertTrue(batch.is_sorted())
+        self.assertIs(Analyzer(batch).batch, batch)
+        self.assertFalse(DatumBatch([1, 1], [True, False]).is_sorted())
+
+
+class TestColumnarAnalyzer(unittest.TestCase):
+
+    def assertSameIntervals(self, expected, actual):
+        self.assertEqual([i.to_json_dict() for i in expected], [i.to_json_dict() for i in actual])
+
+    def test_matches_compute(self):
+        data = [Datum(7, True, {'id': 55}),
+                Datum(9, False, {'id': 11}),
+                Datum(9, False, {'id': 12}),
+                Datum(2, True, {'id': 54}),
+                Datum(3, True, {'id': 19}),
+                Datum(15, False, {'id': 19}),
+                Datum(1, True, {'id': 92}),
+                Datum(14, True, {'id': 33}),
+                Datum(1, False, {'id': 44}),
+                Datum(11, False, {'id': 21})]
+        analyzer = Analyzer.from_arrays([d.time for d in data],
+                                        [not d.censored for d in data],
+                                        [d.meta['id'] for d in data])
+
+        self.assertSameIntervals(Analyzer(data).compute(), analyzer.compute())
+
+    def test_censored_tie(self):
+        """
+        Censored donors tied with a death are removed from the risk set before the deaths, as in compute().
+        """
+        data = [Datum(1, False), Datum(1, True), Datum(3, False), Datum(4, False),
+                Datum(6, True), Datum(6, False), Datum(9, True)]
+        analyzer = Analyzer.from_arrays([d.time for d in data], [not d.censored for d in data])
+        results = analyzer.compute()
+
+        self.assertSameIntervals(Analyzer(data).compute(), results)
+        self.assertAlmostEqual(results[1].cumulative, 5 / 6)
+
+    def test_matches_compute_pickle(self):
+        with open(os.path.join(os.path.dirname(__file__), 'survival.p'), 'rb') as pickle_file:
+            data = [d for d in pickle.load(pickle_file) if d.time is not None]
+        analyzer = Analyzer.from_arrays([d.time for d in data],
+                                        [not d.censored for d in data],
+                                        [d.meta['id'] for d in data])
+
+        self.assertSameIntervals(Analyzer(data).compute(), analyzer.compute())
+
+    def test_lazy_data(self):
+        analyzer = Analyzer.from_arrays([2, 1, 3], [True, False, True])
+        results = analyzer.compute()
+
+        self.assertIsNone(results[0]._data)
+        self.assertEqual([d.time for d in results[0].data], [1, 2])
+
+
+class TestDatumBatch(unittest.TestCase):
+
+    def test_analyzer_accepts_batch(self):
+        data = [Datum(7, True, {'id': 55}),
+                Datum(9, False, {'id': 11}),
+                Datum(2, True, {'id': 54}),
+                Datum(1, False, {'id': 4}),
+                Datum(11, False, {'id': 21})]
+        table = Analyzer(DatumBatch.from_data(data)).compute_table()
+
+        self.assertEqual([i.to_json_dict() for i in Analyzer(data).compute()],
+                         [i.to_json_dict() for i in table.to_intervals()])
+
+    def test_meta_rows(self):
+        meta = [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]
+        batch = DatumBatch([5, 3], [False, True], row=[2, 0], meta=meta).sorted()
+
+        self.assertEqual([d.to_json_dict() for d in batch.materialize()],
+                         [{'time': 3, 'censored': True, 'meta': {'id': 'a'}},
+                          {'time': 5, 'censored': False, 'meta': {'id': 'c'}}])
+
+    def test_slots(self):
+        self.assertFalse(hasattr(Datum(1, False), '__dict__'))
+        self.assertFalse(hasattr(Interval(0, 1), '__dict__'))
+
+    def test_pickle_round_trip(self):
+        datum = pickle.loads(pickle.dumps(Datum(1, True, {'id': 1})))
+
+        self.assertEqual(datum.to_json_dict(), {'time': 1, 'censored': True, 'meta': {'id': 1}})
+
+
+class TestComputeMany(unittest.TestCase):
+
+    times = [7, 9, 9, 2, 3, 15, 1, 14, 1, 11, 4, 4]
+    events = [False, True, True, False, False, True, False, False, True, True, True, False]
+    ids = list(range(12))
+    labels = ['b', 'a', 'b', 'a', 'a', 'b', 'c', 'a', 'b', 'a', 'b', 'b']
+
+    def expected(self, rows):
+        analyzer = Analyzer.from_arrays([self.times[r] for r in rows], [self.events[r] for r in rows],
+                                        [self.ids[r] for r in rows])
+        return [i.to_json_dict() for i in analyzer.compute()]
+
+    def test_labels(self):
+        tables = Analyzer.compute_many(self.times, self.events, self.labels, ids=self.ids)
+
+        self.assertEqual(len(tables), 3)
+        for label, table in zip('abc', tables):
+            rows = [r for r, l in enumerate(self.labels) if l == label]
+            self.assertEqual(self.expected(rows), [i.to_json_dict() for i in table.to_intervals()])
+
+    def test_masks(self):
+        masks = [[l != 'c' for l in self.labels], [r % 3 == 0 for r in self.ids], [False] * 12]
+        tables = Analyzer.compute_many(self.times, self.events, masks, ids=self.ids)
+
+        for mask, table in zip(masks, tables):
+            rows = [r for r in self.ids if mask[r]]
+            self.assertEqual(self.expected(rows), [i.to_json_dict() for i in table.to_intervals()])
+
+
+class TestStreamingAnalyzer(unittest.TestCase):
+
+    def test_matches_compute(self):
+        with open(os.path.join(os.path.dirname(__file__), 'survival.p'), 'rb') as pickle_file:
+            data = [d for d in pickle.load(pickle_file) if d.time is not None]
+        expected = Analyzer(data).compute()
+
+        rows = [(d.time, not d.censored) for d in data]
+        results = StreamingAnalyzer.from_rows(rows, chunk_size=17).compute()
+
+        self.assertEqual(len(results), len(expected))
+        for e, r in zip(expected, results):
+            self.assertEqual((e.start, e.end, e.died, e.get_censored(), e.cumulative),
+                             (r.start, r.end, r.died, r.get_censored(), r.cumulative))
+            self.assertEqual(r.data, [])
+
+    def test_chunks(self):
+        chunks = [([1, 1, 3], [True, False, True]), ([4, 6, 6, 9], [True, False, True, False])]
+        analyzer = StreamingAnalyzer.from_chunks(chunks)
+
+        self.assertEqual(len(analyzer), 7)
+        self.assertEqual(analyzer.times.tolist(), [1, 3, 4, 6, 9])
+        for interval, expected in zip(analyzer.compute(), [1, 5 / 6, 2 / 3, 0.5, 0.25]):
+            self.assertAlmostEqual(interval.cumulative, expected)
+
+
+class TestIncrementalAnalyzer(unittest.TestCase):
+
+    def assertSameCurve(self, expected, actual):
+        self.assertEqual([(i.start, i.end, i.died, i.get_censored()) for i in expected],
+                         [(i.start, i.end, i.died, i.get_censored()) for i in actual])
+        for e, a in zip(expected, actual):
+            self.assertAlmostEqual(e.cumulative, a.cumulative)
+
+    def test_changes(self):
+        data = [Datum(7, True, {'id': 55}),
+                Datum(9, False, {'id': 11}),
+                Datum(2, True, {'id': 54}),
+                Datum(3, True, {'id': 19}),
+                Datum(1, False, {'id': 4}),
+                Datum(11, False, {'id': 21})]
+        analyzer = IncrementalAnalyzer(data)
+        self.assertSameCurve(Analyzer(data).compute(), analyzer.compute())
+
+        analyzer.add(Datum(5, False, {'id': 8}))
+        analyzer.remove(Datum(None, None, {'id': 4}))
+        analyzer.update(Datum(12, True, {'id': 21}))
+        current = [Datum(7, True), Datum(9, False), Datum(2, True), Datum(3, True), Datum(12, True), Datum(5, False)]
+
+        self.assertEqual(len(analyzer), 6)
+        self.assertEqual(analyzer.counts()[0].tolist(), [2, 3, 5, 7, 9, 12])
+        self.assertSameCurve(Analyzer(current).compute(), analyzer.compute())
+
+    def test_many_changes(self):
+        random = np.random.RandomState(5)
+        current = {k: Datum(float(t), bool(c), {'id': k})
+                   for k, (t, c) in enumerate(zip(random.randint(1, 300, 400), random.rand(400) < 0.3))}
+        analyzer = IncrementalAnalyzer(current.values())
+        previous = analyzer.compute()
+        for step in range(5):
+            # Enough new times to merge the buffer, and removals leaving times without donors
+            for k in random.choice(sorted(current), 150, replace=False).tolist():
+                if k % 3:
+                    current[k] = Datum(float(random.rand() * 300), bool(random.rand() < 0.3), {'id': k})
+                    analyzer.update(current[k])
+                else:
+                    analyzer.remove(current.pop(k))
+            results = analyzer.compute()
+
+            self.assertIs(analyzer.compute(), results)
+            self.assertSameCurve(Analyzer(list(current.values())).compute(), results)
+            self.assertTrue(set(map(id, results)) & set(map(id, previous)))
+            previous = results
+
+    def test_errors(self):
+        analyzer = IncrementalAnalyzer([Datum(1, False, {'id': 1})])
+
+        self.assertRaises(ValueError, analyzer.add, Datum(2, False, {'id': 1}))
+        self.assertRaises(KeyError, analyzer.remove, Datum(2, False, {'id': 2}))
+
+
+class TestCurveStatistics(unittest.TestCase):
+
+    def test_greenwood(self):
+        results = Analyzer([Datum(1, False), Datum(2, False), Datum(3, False), Datum(4, False)]).compute()
+
+        self.assertEqual([i.cumulative for i in results], [1, 0.75, 0.5, 0.25])
+        for interval, expected in zip(results, [0, 0.75 ** 2 / 12, 0.5 ** 2 * (1 / 12 + 1 / 6), 0.046875]):
+            self.assertAlmostEqual(interval.variance, expected)
+        for interval in results:
+            self.assertTrue(interval.lower <= interval.cumulative <= interval.upper)
+        self.assertEqual((results[0].lower, results[0].upper), (1, 1))
+
+    def test_columnar_matches(self):
+        data = TestIterJson.data
+        expected = Analyzer(data).compute()
+        results = Analyzer(DatumBatch.from_data(data)).compute()
+
+        for e, r in zip(expected, results):
+            self.assertEqual((e.variance, e.lower, e.upper), (r.variance, r.lower, r.upper))
+
+    def test_median(self):
+        analyzer = Analyzer.from_arrays([1, 2, 3, 4], [True, True, True, True])
+        analyzer.compute()
+
+        self.assertEqual(analyzer.median, {'median': 2, 'lower': 1, 'upper': 4})
+        self.assertIsNone(Analyzer([Datum(1, False), Datum(2, True), Datum(3, True)]).compute_table().median['median'])
+
+    def test_survival_at(self):
+        analyzer = Analyzer(TestIterJson.data)
+        table = analyzer.compute_table()
+
+        for time, expected in [(0, 1), (0.5, 1), (1, 5 / 6), (2, 5 / 6), (6, 0.25), (100, 0.25)]:
+            self.assertAlmostEqual(analyzer.survival_at(time), expected)
+            self.assertAlmostEqual(table.survival_at(time), expected)
+
+
+class TestReducedOutput(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(3)
+        self.times = random.randint(1, 2000, 5000)
+        self.events = random.rand(5000) < 0.7
+        self.table = Analyzer.from_arrays(self.times, self.events).compute_table()
+
+    def assertWithin(self, reduced, epsilon):
+        # Cumulative survival shown by the reduced curve over each exact interval
+        shown = reduced.cumulative[np.searchsorted(reduced.end, self.table.end)]
+        self.assertLessEqual(np.abs(shown - self.table.cumulative).max(), epsilon)
+        self.assertEqual(reduced.died.sum(), self.table.died.sum())
+        self.assertEqual(reduced.censored.sum(), self.table.censored.sum())
+        self.assertEqual(reduced.offsets[[0, -1]].tolist(), [0, 5000])
+
+    def test_epsilon(self):
+        reduced = self.table.simplify(epsilon=0.01)
+
+        self.assertLess(len(reduced), len(self.table))
+        self.assertWithin(reduced, 0.01)
+        self.assertEqual(len(self.table.simplify()), len(self.table))
+
+    def test_max_points(self):
+        for max_points in (1, 10, 100):
+            reduced = self.table.simplify(max_points=max_points)
+
+            self.assertLessEqual(len(reduced), max_points)
+            self.assertWithin(reduced, 1.01 / max_points)
+        self.assertRaises(ValueError, self.table.simplify, max_points=0)
+
+    def test_compute(self):
+        data = [Datum(t, not e, {'id': i}) for i, (t, e) in enumerate(zip(self.times.tolist(), self.events.tolist()))]
+        analyzer = Analyzer(data)
+        results = analyzer.compute(max_points=50, donor_sample=3)
+        exact = Analyzer(data).compute()
+
+        self.assertLessEqual(len(results), 50)
+        self.assertEqual(set(results[0].to_json_dict()), set(exact[0].to_json_dict()))
+        self.assertEqual(results[-1].end, exact[-1].end)
+        self.assertEqual(sum(i.get_censored() for i in results), sum(i.get_censored() for i in exact))
+        self.assertTrue(all(len(i.data) == 3 for i in results))
+        self.assertAlmostEqual(analyzer.survival_at(1000), Analyzer(data).survival_at(1000))
+
+    def test_donor_sample(self):
+        intervals = self.table.to_intervals(donor_sample=2)
+
+        for interval, lo, hi in zip(intervals, self.table.offsets[:-1], self.table.offsets[1:]):
+            self.assertEqual(len(interval.data), min(2, hi - lo))
+            self.assertEqual([interval.data[0].time, interval.data[-1].time],
+                             self.table.batch.time[[lo, hi - 1]].tolist())
+
+
+class TestIterJson(unittest.TestCase):
+
+    data = [Datum(1, False, {'id': 'D13'}),
+            Datum(1, True, {'id': 'D54'}),
+            Datum(3, False, {'id': 'D81'}),
+            Datum(4, False, {'id': 'D95'}),
+            Datum(6, True, {'id': 'D32'}),
+            Datum(6, False, {'id': 'D20'}),
+            Datum(9, True, {'id': 'D51'})]
+
+    def test_matches_json_dumps(self):
+        results = Analyzer(self.data).compute()
+        expected = json.dumps([interval.to_json_dict() for interval in results])
+
+        self.assertEqual(''.join(iter_json(results, chunk_size=1)), expected)
+
+    def test_columnar(self):
+        expected = json.dumps([interval.to_json_dict() for interval in Analyzer(self.data).compute()])
+        results = Analyzer(DatumBatch.from_data(self.data)).compute()
+
+        self.assertEqual(''.join(iter_json(results)), expected)
+        self.assertIsNone(results[0]._data)
+
+    def test_donor_options(self):
+        results = Analyzer(self.data).compute()
+
+        without = json.loads(''.join(iter_json(results, include_donors=False)))
+        capped = json.loads(''.join(iter_json(results, max_donors=1)))
+
+        self.assertTrue(all('donors' not in interval for interval in without))
+        self.assertEqual([len(interval['donors']) for interval in capped], [1, 1, 1, 1, 1])
+        self.assertEqual([interval['died'] for interval in capped], [1, 1, 1, 1, 0])
+
 
 class TestInterval(unittest.TestCase):
 
@@ -69,3 +416,18 @@ class TestInterval(unittest.TestCase):
         interval.data = data
 
         self.assertEqual(interval.get_censored(), 2)
+
+    def test_add_datum_counts_censored(self):
+        interval = Interval(0, 2)
+        interval.add_datum(Datum(1, True))
+        interval.add_datum(Datum(2, False))
+        interval.increment_died()
+
+        self.assertEqual(interval.get_censored(), 1)
+        self.assertEqual(interval.to_json_dict()['censored'], 1)
+
+    def test_columnar_censored_is_lazy(self):
+        results = Analyzer.from_arrays([1, 1, 2, 3], [True, False, False, True]).compute()
+
+        self.assertEqual([i.get_censored() for i in results], [1, 1])
+        self.assertIsNone(results[0]._data)